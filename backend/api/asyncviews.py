@@ -0,0 +1,105 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.urls import URLPattern
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+READ_ACTIONS = ('list', 'retrieve', 'feed', 'similar', 'pantry')
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_READ_THREADS,
+            thread_name_prefix='foodgram-read'
+        )
+    return _executor
+
+
+def add_execute_wrapper(request, wrapper):
+    """
+    Обёртка SQL-запросов для вьюх, обёрнутых async_view.
+
+    В асинхронном режиме вьюха выполняется не в потоке middleware, а
+    подключения к базе у каждого потока свои, поэтому execute_wrapper
+    ставится в потоке вьюхи. Запросы вьюх вне async_urls (админка,
+    djoser) в этом режиме не учитываются.
+    """
+    wrappers = getattr(request, 'execute_wrappers', None)
+    if wrappers is None:
+        wrappers = request.execute_wrappers = []
+    wrappers.append(wrapper)
+
+
+def run_view(view, request, *args, **kwargs):
+    with ExitStack() as stack:
+        for wrapper in getattr(request, 'execute_wrappers', ()):
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(wrapper))
+
+        response = view(request, *args, **kwargs)
+        if not response.streaming and callable(
+                getattr(response, 'render', None)):
+            response.render()
+        return response
+
+
+def run_read_view(view, request, *args, **kwargs):
+    """
+    Вызов вьюхи в потоке пула. Подключения потока проверяются до и после
+    запроса, как в request_started и request_finished.
+    """
+    close_old_connections()
+    try:
+        return run_view(view, request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def async_view(view, read_in_pool=False):
+    """
+    Асинхронная обёртка DRF-вьюсета для ASGI.
+
+    При read_in_pool чтение выполняется тем же вьюсетом в пуле из
+    ASYNC_READ_THREADS потоков со своими подключениями к базе: ответы и
+    права доступа совпадают с синхронными, а воркер обслуживает
+    несколько запросов одновременно. Остальное, как обычные синхронные
+    вьюхи Django, выполняется по очереди в общем потоке.
+    """
+    async def wrapper(request, *args, **kwargs):
+        if read_in_pool and request.method in READ_METHODS:
+            return await sync_to_async(
+                run_read_view, thread_sensitive=False,
+                executor=get_executor()
+            )(view, request, *args, **kwargs)
+
+        return await sync_to_async(run_view)(view, request, *args, **kwargs)
+
+    return functools.update_wrapper(wrapper, view)
+
+
+def async_urls(urls, read_viewsets):
+    """
+    Маршруты вьюсетов с асинхронными вьюхами; чтение (READ_ACTIONS)
+    вьюсетов из read_viewsets выполняется в пуле потоков.
+    """
+    result = []
+    for pattern in urls:
+        callback = getattr(pattern, 'callback', None)
+        if getattr(callback, 'cls', None) is not None:
+            actions = getattr(callback, 'actions', None) or {}
+            read_in_pool = (callback.cls in read_viewsets
+                            and actions.get('get') in READ_ACTIONS)
+            pattern = URLPattern(
+                pattern.pattern, async_view(callback, read_in_pool),
+                pattern.default_args, pattern.name
+            )
+        result.append(pattern)
+    return result
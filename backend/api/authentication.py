@@ -0,0 +1,133 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from recipe.counters import counters
+from recipe.versions import get_version, is_shared_cache
+
+User = get_user_model()
+
+
+class TokenCache:
+    """
+    Снимки пользователей по токену: LRU на TOKEN_CACHE_SIZE записей с
+    временем жизни TOKEN_CACHE_TTL секунд. При заданном
+    TOKEN_CACHE_ALIAS промахи проверяются ещё и в общем кеше Django.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(token_key):
+        digest = hashlib.sha256(token_key.encode()).hexdigest()
+        return f'auth:token:{digest}'
+
+    @property
+    def shared(self):
+        alias = settings.TOKEN_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    def get(self, token_key):
+        key = self.key(token_key)
+        now = time.monotonic()
+
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                expires, entry = item
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return entry
+                del self._entries[key]
+
+        if self.shared is None:
+            return None
+
+        entry = self.shared.get(key)
+        if entry is not None:
+            self.remember(key, entry)
+        return entry
+
+    def set(self, token_key, entry):
+        key = self.key(token_key)
+        self.remember(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry, timeout=settings.TOKEN_CACHE_TTL)
+
+    def remember(self, key, entry):
+        expires = time.monotonic() + settings.TOKEN_CACHE_TTL
+        with self._lock:
+            self._entries[key] = (expires, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+
+token_cache = TokenCache()
+
+
+@lru_cache(maxsize=None)
+def snapshot_fields():
+    skipped = {field for model, field, *_ in counters() if model is User}
+    return tuple(field.attname for field in User._meta.concrete_fields
+                 if field.attname not in skipped)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без SQL-запроса на каждый запрос.
+
+    Снимок пользователя действителен, пока не изменилась версия
+    ('auth', user_id): она меняется при выходе через djoser, удалении
+    токена и сохранении пользователя (смена пароля, деактивация).
+    Счётчики пользователя в снимок не входят и читаются из базы при
+    обращении, поэтому save() их не перезаписывает.
+
+    Версии должны быть видны всем воркерам, поэтому с кешем в памяти
+    процесса (LocMemCache) снимки не используются: иначе отозванный в
+    другом воркере токен принимался бы до TOKEN_CACHE_TTL секунд.
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_shared_cache():
+            return super().authenticate_credentials(key)
+
+        entry = token_cache.get(key)
+        user_id = entry[0] if entry is not None else None
+        # Версия читается до загрузки пользователя: изменение, сделанное
+        # между ними, не сохранится в снимке со своей новой версией.
+        version = get_version('auth', user_id) if user_id else None
+        if entry is not None and entry[3] == version:
+            return self.restore(key, entry[1], entry[2])
+
+        user, token = super().authenticate_credentials(key)
+        if user.id != user_id:
+            # Версию без id пользователя прочитать заранее нельзя: снимок
+            # проверится и сохранится с версией при следующем запросе.
+            version = None
+        token_cache.set(key, (
+            user.id,
+            tuple(getattr(user, field) for field in snapshot_fields()),
+            token.created,
+            version,
+        ))
+        return user, token
+
+    @staticmethod
+    def restore(key, values, created):
+        user = User.from_db(DEFAULT_DB_ALIAS, snapshot_fields(), values)
+        token = Token.from_db(DEFAULT_DB_ALIAS, ('key', 'user_id', 'created'),
+                              (key, user.id, created))
+        token.user = user
+        return user, token
@@ -0,0 +1,280 @@
+import io
+import math
+import random
+import time
+from collections import namedtuple
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipe.counters import reconcile
+from recipe.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                           ShoppingCart, Subscribe, Tag)
+from recipe.search import update_search_vectors
+from recipe.shopping_list import rebuild_shopping_list
+from recipe.similar import build_similar
+from recipe.timeline import rebuild_timeline
+from recipe.versions import bump_version
+
+User = get_user_model()
+
+BENCHMARK_IMAGE = 'recipe_images/benchmark.jpg'
+
+Endpoint = namedtuple('Endpoint', ('name', 'url', 'budget', 'anonymous'),
+                      defaults=(False,))
+
+# Бюджет — максимальное число SQL-запросов на один ответ, включая
+# аутентификацию по токену при холодном кеше токенов. Число не должно
+# зависеть от размера страницы: превышение почти всегда означает N+1
+# в api/serializers.py.
+ENDPOINTS = (
+    Endpoint('recipes', '/api/recipes/', 5),
+    Endpoint('recipes_anonymous', '/api/recipes/', 4, True),
+    Endpoint('recipes_page', '/api/recipes/?page=2', 5),
+    Endpoint('recipes_cursor', '/api/recipes/?pagination=cursor', 4),
+    Endpoint('recipes_approximate', '/api/recipes/?count=approximate', 6),
+    Endpoint('recipes_tags', '/api/recipes/?tags={tag}', 6),
+    Endpoint('recipes_author', '/api/recipes/?author={author}', 6),
+    Endpoint('recipes_favorited', '/api/recipes/?is_favorited=1', 5),
+    Endpoint('recipes_in_cart', '/api/recipes/?is_in_shopping_cart=1', 5),
+    Endpoint('recipes_popularity', '/api/recipes/?ordering=popularity', 5),
+    Endpoint('recipes_min_favorites', '/api/recipes/?min_favorites=1', 5),
+    Endpoint('recipes_search', '/api/recipes/?search={search}', 7),
+    Endpoint('recipe_detail', '/api/recipes/{recipe}/', 4),
+    Endpoint('recipes_pantry', '/api/recipes/pantry/?{pantry}', 4),
+    Endpoint('recipe_similar', '/api/recipes/{recipe}/similar/', 2),
+    Endpoint('feed', '/api/recipes/feed/', 6),
+    Endpoint('subscriptions', '/api/users/subscriptions/?recipes_limit=3',
+             4),
+    Endpoint('ingredients_search', '/api/ingredients/?name={ingredient}', 2),
+    Endpoint('tags', '/api/tags/', 2),
+    Endpoint('shopping_cart_txt',
+             '/api/recipes/download_shopping_cart/?format=txt', 3),
+    Endpoint('shopping_cart_csv',
+             '/api/recipes/download_shopping_cart/?format=csv', 3),
+    Endpoint('shopping_cart_pdf',
+             '/api/recipes/download_shopping_cart/?format=pdf', 3),
+    Endpoint('users', '/api/users/', 4),
+)
+
+
+class Dataset:
+    """
+    Тестовые пользователи, рецепты, избранное, списки покупок и подписки.
+
+    Пользователи создаются с префиксом benchmark_, ингредиенты и теги
+    берутся из базы (недостающие создаются). Запросы делает первый
+    пользователь набора.
+    """
+
+    def __init__(self, users=50, recipes=500, favorites=20, cart=10,
+                 subscriptions=10, ingredients=200):
+        self.size = {
+            'users': users,
+            'recipes': recipes,
+            'favorites': favorites,
+            'cart': cart,
+            'subscriptions': subscriptions,
+            'ingredients': ingredients,
+        }
+        self.random = random.Random(0)
+
+    def seed(self):
+        users = self.create_users()
+        ingredients = self.ingredients()
+        tags = self.tags()
+        recipes = self.create_recipes(users, ingredients, tags)
+        self.create_relations(users, recipes)
+
+        user_ids = [user.id for user in users]
+        reconcile(User, 'recipes_count', Recipe, 'author', user_ids)
+        reconcile(User, 'followers_count', Subscribe, 'author', user_ids)
+        reconcile(Recipe, 'favorites_count', Favorite, 'recipe', recipes)
+        rebuild_shopping_list(user_ids)
+        rebuild_timeline(user_ids)
+        build_similar(recipes)
+        update_search_vectors(recipes)
+        bump_version('recipes')
+
+        self.user = users[0]
+        self.token = Token.objects.create(user=self.user).key
+        self.params = {
+            'recipe': recipes[-1],
+            'author': users[1].id if len(users) > 1 else users[0].id,
+            'tag': Tag.objects.get(pk=tags[0]).slug,
+            'ingredient': Ingredient.objects.get(pk=ingredients[0]).name[:2],
+            'search': 'Рецепт',
+            'pantry': urlencode([('ingredients', pk)
+                                 for pk in ingredients[:5]]),
+        }
+
+    def create_users(self):
+        count = self.size['users']
+        prefix = f'benchmark_{time.time_ns()}_'
+        users = [
+            User(username=f'{prefix}{number}',
+                 email=f'{prefix}{number}@benchmark.local',
+                 first_name='Benchmark', last_name=str(number))
+            for number in range(count)
+        ]
+        User.objects.bulk_create(users)
+        return list(User.objects.filter(username__startswith=prefix)
+                    .order_by('id'))
+
+    def ingredients(self):
+        ids = list(Ingredient.objects.values_list('id', flat=True)
+                   [:self.size['ingredients']])
+        missing = self.size['ingredients'] - len(ids)
+        if missing > 0:
+            prefix = f'benchmark {time.time_ns()}'
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'{prefix} {number}', measurement_unit='г')
+                for number in range(missing)
+            )
+            ids += Ingredient.objects.filter(
+                name__startswith=prefix
+            ).values_list('id', flat=True)
+        return ids
+
+    def tags(self):
+        ids = list(Tag.objects.values_list('id', flat=True))
+        if not ids:
+            Tag.objects.bulk_create(
+                Tag(name=f'Benchmark {number}', color=f'#BE00{number:02X}',
+                    slug=f'benchmark-{number}')
+                for number in range(3)
+            )
+            bump_version('tags')
+            ids = list(Tag.objects.values_list('id', flat=True))
+        return ids
+
+    def create_recipes(self, users, ingredients, tags):
+        image = self.image()
+        recipes = []
+        for number in range(self.size['recipes']):
+            recipe = Recipe(
+                name=f'Рецепт {number}',
+                author=self.random.choice(users),
+                image=image,
+                text='Рецепт для замеров производительности.',
+                cooking_time=self.random.randint(5, 120)
+            )
+            recipes.append(recipe)
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient_id=ingredient,
+                             amount=self.random.randint(1, 500))
+            for recipe in recipes
+            for ingredient in self.random.sample(
+                ingredients, min(len(ingredients), 8))
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag)
+            for recipe in recipes
+            for tag in self.random.sample(
+                tags, self.random.randint(1, min(len(tags), 3)))
+        )
+        return [recipe.id for recipe in recipes]
+
+    def create_relations(self, users, recipes):
+        def sample(population, size):
+            return self.random.sample(population,
+                                      min(len(population), size))
+
+        favorites, cart, subscriptions = [], [], []
+        for user in users:
+            favorites += [Favorite(user=user, recipe_id=recipe)
+                          for recipe in sample(recipes,
+                                               self.size['favorites'])]
+            cart += [ShoppingCart(user=user, recipe_id=recipe)
+                     for recipe in sample(recipes, self.size['cart'])]
+            authors = [author for author in users if author != user]
+            subscriptions += [
+                Subscribe(user=user, author=author)
+                for author in sample(authors, self.size['subscriptions'])
+            ]
+
+        Favorite.objects.bulk_create(favorites)
+        ShoppingCart.objects.bulk_create(cart)
+        Subscribe.objects.bulk_create(subscriptions)
+
+    def image(self):
+        if not default_storage.exists(BENCHMARK_IMAGE):
+            buffer = io.BytesIO()
+            Image.new('RGB', (480, 480), '#E26C2D').save(buffer, 'JPEG')
+            default_storage.save(BENCHMARK_IMAGE,
+                                 ContentFile(buffer.getvalue()))
+        return BENCHMARK_IMAGE
+
+
+def percentile(values, percent):
+    """Процентиль по методу ближайшего ранга."""
+    values = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def client_for(dataset, endpoint):
+    client = APIClient()
+    if not endpoint.anonymous:
+        client.credentials(HTTP_AUTHORIZATION=f'Token {dataset.token}')
+    return client
+
+
+@override_settings(SQL_PROFILER_SAMPLE_RATE=0, DATABASE_REPLICAS=[])
+def measure(dataset, endpoint, repeat):
+    """
+    Первый (холодный) запрос считает SQL-запросы, следующие repeat
+    запросов замеряют время ответа. Профилировщик SQL отключён, чтобы
+    его EXPLAIN не попадали в замеры, реплики — потому что набор данных
+    существует только в транзакции основной базы.
+    """
+    url = endpoint.url.format(**dataset.params)
+    client = client_for(dataset, endpoint)
+
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+        # Потоковый ответ выполняет запросы при чтении тела.
+        size = len(b''.join(response.streaming_content)
+                   if response.streaming else response.content)
+    # Каждый следующий запрос очищает connection.queries_log.
+    queries = len(context)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'name': endpoint.name,
+        'url': url,
+        'status': response.status_code,
+        'queries': queries,
+        'budget': endpoint.budget,
+        'bytes': size,
+        'latency_ms': {
+            'min': round(min(timings), 3),
+            'p50': round(percentile(timings, 50), 3),
+            'p90': round(percentile(timings, 90), 3),
+            'p95': round(percentile(timings, 95), 3),
+            'p99': round(percentile(timings, 99), 3),
+            'max': round(max(timings), 3),
+            'mean': round(sum(timings) / len(timings), 3),
+        },
+    }
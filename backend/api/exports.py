@@ -0,0 +1,149 @@
+import csv
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipe.models import ShoppingListItem
+from recipe.versions import get_version
+
+CHUNK_SIZE = 500
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+
+
+def shopping_list_rows(user):
+    return (
+        ShoppingListItem.objects
+        .filter(user=user)
+        .order_by('ingredient__name')
+        .values_list('ingredient__name', 'total_amount',
+                     'ingredient__measurement_unit')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def export_txt(rows):
+    yield 'Список покупок: \n'.encode()
+    for row in rows:
+        yield '* {} - {} {}. \n'.format(*row).encode()
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+def export_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit')).encode()
+    for name, amount, measurement_unit in rows:
+        yield writer.writerow((name, amount, measurement_unit)).encode()
+
+
+def get_pdf_font():
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+
+    try:
+        pdfmetrics.registerFont(TTFont(PDF_FONT_NAME,
+                                       settings.SHOPPING_LIST_FONT))
+    except Exception:
+        return 'Helvetica'
+
+    return PDF_FONT_NAME
+
+
+def export_pdf(rows):
+    buffer = io.BytesIO()
+    font = get_pdf_font()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    position = height - PDF_MARGIN
+
+    pdf.setFont(font, PDF_FONT_SIZE + 4)
+    pdf.drawString(PDF_MARGIN, position, 'Список покупок:')
+    pdf.setFont(font, PDF_FONT_SIZE)
+
+    for row in rows:
+        position -= PDF_LINE_HEIGHT
+        if position < PDF_MARGIN:
+            pdf.showPage()
+            pdf.setFont(font, PDF_FONT_SIZE)
+            position = height - PDF_MARGIN
+        pdf.drawString(PDF_MARGIN, position, '• {} - {} {}.'.format(*row))
+
+    pdf.save()
+    yield buffer.getvalue()
+
+
+EXPORTERS = {
+    'txt': (export_txt, 'text/plain; charset=utf-8'),
+    'csv': (export_csv, 'text/csv; charset=utf-8'),
+    'pdf': (export_pdf, 'application/pdf'),
+}
+
+
+class ShoppingListExport:
+    """
+    Выгрузка списка покупок в выбранном формате.
+
+    ETag считается по агрегату строк списка покупок (число, сумма
+    количеств, сумма количеств с весом id ингредиента, последний id) и
+    версии ингредиентов: один запрос без чтения самих строк, одинаковый
+    во всех воркерах. Готовый файл для неизменённого списка отдаётся из
+    кэша, иначе строки читаются курсором по мере отдачи ответа.
+    """
+
+    def __init__(self, user, export_format):
+        self.user = user
+        self.format = export_format
+        self.exporter, self.content_type = EXPORTERS[export_format]
+        summary = ShoppingListItem.objects.filter(user=user).aggregate(
+            count=Count('id'),
+            last=Max('id'),
+            total=Sum('total_amount'),
+            weighted=Sum(F('ingredient_id') * F('total_amount')),
+        )
+        self.is_empty = not summary['count']
+        signature = repr((
+            user.id,
+            export_format,
+            sorted(summary.items()),
+            # Переименование ингредиента не меняет строки списка.
+            get_version('ingredients'),
+        ))
+        self.etag = '"{}"'.format(hashlib.sha1(signature.encode()).hexdigest())
+        self.cache_key = f'shopping_list:{self.etag[1:-1]}'
+
+    @property
+    def filename(self):
+        return f'shopping_list.{self.format}'
+
+    def cached(self):
+        return cache.get(self.cache_key)
+
+    def stream(self):
+        chunks = []
+        size = 0
+
+        for chunk in self.exporter(shopping_list_rows(self.user)):
+            size += len(chunk)
+            if chunks is not None:
+                chunks.append(chunk)
+                if size > settings.SHOPPING_LIST_CACHE_MAX_SIZE:
+                    chunks = None
+            yield chunk
+
+        if chunks is not None:
+            cache.set(self.cache_key, b''.join(chunks),
+                      settings.SHOPPING_LIST_CACHE_TIMEOUT)
@@ -0,0 +1,239 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from rest_framework import serializers
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from api.fields import file_url, variant_urls
+from api.metrics import serialization
+from api.relations import get_relations
+from api.serializers import (CustomUserSerializer,
+                             IngredientsReadRecipeSerializer,
+                             RecipeReadSerializer, TagSerializer)
+from recipe.models import IngredientRecipe, Recipe
+
+PLAIN_FIELDS = (serializers.BooleanField, serializers.CharField,
+                serializers.IntegerField)
+
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart', 'is_author_subscribed')
+
+
+class FileURLs(dict):
+    """URL файлов, посчитанные один раз на страницу."""
+
+    def __init__(self, request):
+        super().__init__()
+        self.request = request
+
+    def __missing__(self, name):
+        url = self[name] = file_url(name, self.request)
+        return url
+
+
+class RowBuilder:
+    """
+    Представление сериализатора, собранное из строки values().
+
+    Поля сериализатора разбираются один раз: простые поля читаются из
+    колонки source (с префиксом для связанных моделей), остальные
+    передаются в custom как функции (row, context).
+    """
+
+    def __init__(self, serializer_class, prefix='', **custom):
+        self.columns = []
+        self.fields = []
+
+        for name, field in serializer_class().fields.items():
+            if name in custom:
+                self.fields.append((name, None, custom[name]))
+                continue
+
+            column = prefix + field.source.replace('.', '__')
+            self.columns.append(column)
+            self.fields.append((name, column, self.converter(field)))
+
+    @staticmethod
+    def converter(field):
+        if isinstance(field, serializers.FileField):
+            return lambda value, context: context['urls'][value]
+
+        if isinstance(field, PLAIN_FIELDS):
+            return None
+
+        if isinstance(field, (serializers.BaseSerializer,
+                              serializers.SerializerMethodField)):
+            raise TypeError(
+                f'Поле {field.field_name} нужно передать в custom.'
+            )
+
+        return lambda value, context: field.to_representation(value)
+
+    def build(self, row, context):
+        result = {}
+
+        for name, column, convert in self.fields:
+            if column is None:
+                result[name] = convert(row, context)
+                continue
+
+            value = row[column]
+            if convert is not None and value is not None:
+                value = convert(value, context)
+            result[name] = value
+
+        return result
+
+
+class RecipeReader:
+    """
+    Быстрый путь чтения рецептов в обход RecipeReadSerializer.
+
+    Рецепты и авторы читаются одним запросом values(), теги и ингредиенты
+    страницы — ещё двумя. Ответ совпадает с RecipeReadSerializer.
+    """
+
+    @cached_property
+    def recipe(self):
+        return RowBuilder(
+            RecipeReadSerializer,
+            tags=lambda row, context: context['tags'][row['id']],
+            author=self.build_author,
+            ingredients=(
+                lambda row, context: context['ingredients'][row['id']]
+            ),
+            is_favorited=self.flag('is_favorited', 'id', 'favorites'),
+            is_in_shopping_cart=self.flag('is_in_shopping_cart', 'id',
+                                          'shopping_cart'),
+            image_variants=lambda row, context: variant_urls(
+                row['image_variants'], row['image'],
+                context['urls'].__getitem__
+            ),
+        )
+
+    @cached_property
+    def author(self):
+        return RowBuilder(
+            CustomUserSerializer, prefix='author__',
+            is_subscribed=self.flag('is_author_subscribed', 'author__id',
+                                    'following')
+        )
+
+    @cached_property
+    def tag(self):
+        return RowBuilder(TagSerializer, prefix='tag__')
+
+    @cached_property
+    def ingredient(self):
+        return RowBuilder(IngredientsReadRecipeSerializer)
+
+    @staticmethod
+    def flag(annotation, column, relation):
+        def build(row, context):
+            value = row.get(annotation)
+            if value is not None:
+                return value
+
+            relations = get_relations(context['request'])
+            return row[column] in relations.get(relation)
+
+        return build
+
+    def build_author(self, row, context):
+        return self.author.build(row, context)
+
+    def values(self, queryset):
+        columns = dict.fromkeys(
+            self.recipe.columns + self.author.columns + ['image_variants']
+        )
+        columns.update(dict.fromkeys(
+            flag for flag in USER_FLAGS if flag in queryset.query.annotations
+        ))
+        return queryset.values(*columns)
+
+    def read(self, rows, request):
+        return self.build(rows, self.load(rows, request))
+
+    def build(self, rows, context):
+        return [self.recipe.build(row, context) for row in rows]
+
+    def load(self, rows, request):
+        """Теги и ингредиенты для страницы рецептов."""
+        ids = [row['id'] for row in rows]
+        return {
+            'request': request,
+            'urls': FileURLs(request),
+            'tags': self.group(
+                Recipe.tags.through.objects
+                .filter(recipe_id__in=ids)
+                .order_by('tag__slug'),
+                self.tag, request
+            ),
+            'ingredients': self.group(
+                IngredientRecipe.objects
+                .filter(recipe_id__in=ids)
+                .order_by('id'),
+                self.ingredient, request
+            ),
+        }
+
+    @staticmethod
+    def group(queryset, builder, request):
+        context = {'request': request, 'urls': FileURLs(request)}
+        groups = defaultdict(list)
+
+        for row in queryset.values('recipe_id', *builder.columns):
+            groups[row['recipe_id']].append(builder.build(row, context))
+
+        return groups
+
+
+recipe_reader = RecipeReader()
+
+
+class FastReadMixin:
+    """
+    При FAST_READ_PATH отдаёт list и retrieve в JSON через fast_reader.
+    """
+
+    fast_reader = None
+
+    def use_fast_read(self):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return (settings.FAST_READ_PATH
+                and self.action in ('list', 'retrieve')
+                and renderer is not None and renderer.format == 'json')
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_read():
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.fast_reader.values(
+            self.filter_queryset(self.get_queryset())
+        )
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        with serialization(request):
+            data = self.fast_reader.read(rows, request)
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_fast_read():
+            return super().retrieve(request, *args, **kwargs)
+
+        queryset = self.fast_reader.values(
+            self.filter_queryset(self.get_queryset())
+        )
+        # Объектные права на чтение не ограничивают (SAFE_METHODS), поэтому
+        # check_object_permissions для строки values() не вызывается.
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        with serialization(request):
+            data = self.fast_reader.read([row], request)[0]
+        return Response(data)
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from recipe.imaging import FORMATS
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Ссылки на уменьшенные копии изображения рецепта.
+
+    Пока копии не готовы, для каждого варианта отдаётся оригинал.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        return variant_urls(recipe.image_variants, recipe.image.name,
+                            lambda name: file_url(name, request))
+
+
+def variant_urls(variants, image_name, url):
+    variants = variants or {}
+    result = {}
+
+    for name in settings.IMAGE_VARIANTS:
+        files = variants.get(name) or {
+            extension: image_name for extension in FORMATS
+        }
+        result[name] = {
+            extension: url(files[extension])
+            for extension in FORMATS
+        }
+
+    return result
+
+
+def file_url(name, request=None):
+    if not name:
+        return None
+
+    url = default_storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
@@ -2,6 +2,7 @@ from django_filters.rest_framework import FilterSet, filters
 from django.contrib.auth import get_user_model
 
 from recipe.models import Ingredient, Recipe, Tag
+from recipe.search import search_recipes
 
 User = get_user_model()
 
@@ -14,6 +15,17 @@ class IngredientFilter(FilterSet):
         fields = ('name', )
 
 
+class RecipeOrderingFilter(filters.OrderingFilter):
+
+    def filter(self, qs, value):
+        qs = super().filter(qs, value)
+
+        if value:
+            qs = qs.order_by(*qs.query.order_by, '-id')
+
+        return qs
+
+
 class RecipeFilter(FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
@@ -23,6 +35,15 @@ class RecipeFilter(FilterSet):
                                              to_field_name='slug',
                                              queryset=Tag.objects.all())
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
+    min_favorites = filters.NumberFilter(field_name='favorites_count',
+                                         lookup_expr='gte')
+    search = filters.CharFilter(method='filter_search')
+    ordering = RecipeOrderingFilter(
+        fields=(('favorites_count', 'popularity'),)
+    )
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -38,4 +59,5 @@ class RecipeFilter(FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart', )
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'min_favorites', 'search', )
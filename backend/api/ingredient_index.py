@@ -0,0 +1,73 @@
+import threading
+from bisect import bisect_left
+
+from recipe.models import Ingredient
+from recipe.replicas import primary
+from recipe.versions import get_version
+
+PREFIX_END = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Хранит отсортированный список имён в casefold и ищет префикс бинарным
+    поиском. Загружается при первом обращении и перестраивается, когда
+    меняется версия 'ingredients': её сбрасывают сигналы Ingredient и
+    load_csv. Другие воркеры видят новую версию через общий кеш, а с
+    кешем в памяти процесса — не позже VERSION_LOCAL_TIMEOUT секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        # (ключи, строки) публикуются одним присваиванием: читатель вне
+        # блокировки не увидит новые ключи со старыми строками.
+        self._index = ([], [])
+
+    def search(self, query, limit=None):
+        keys, rows = self._load()
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + PREFIX_END, start)
+
+        result = rows[start:end]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+
+        for position, key in enumerate(keys):
+            if query in key and not key.startswith(query):
+                result.append(rows[position])
+                if limit is not None and len(result) >= limit:
+                    break
+
+        return result
+
+    def _load(self):
+        version = get_version('ingredients')
+
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    with primary():
+                        self._build(version)
+
+        return self._index
+
+    def _build(self, version):
+        ingredients = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        self._index = (
+            [key for key, *_ in ingredients],
+            [{'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+             for _, pk, name, measurement_unit in ingredients],
+        )
+        self._version = version
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,168 @@
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+
+from api.benchmarks import percentile
+
+
+class Load:
+    """
+    Закрытая нагрузка: concurrency клиентов по кругу запрашивают urls,
+    пока не будет отправлено total запросов. Задержка считается от
+    отправки запроса до получения всего ответа, включая ожидание
+    свободного воркера.
+    """
+
+    def __init__(self, urls, token=None):
+        self.urls = urls
+        self.headers = []
+        if token:
+            self.headers.append((b'authorization', f'Token {token}'.encode()))
+
+    @staticmethod
+    def summary(concurrency, timings, errors, elapsed):
+        return {
+            'concurrency': concurrency,
+            'requests': len(timings),
+            'errors': errors,
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+        }
+
+
+class SyncLoad(Load):
+    """Синхронный воркер (gunicorn sync): WSGI, один запрос за раз."""
+
+    def __init__(self, urls, token=None):
+        super().__init__(urls, token)
+        self.application = get_wsgi_application()
+        self.worker = ThreadPoolExecutor(max_workers=1)
+
+    def environ(self, url):
+        parts = urlsplit(url)
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': parts.path,
+            'QUERY_STRING': parts.query,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': io.StringIO(),
+        }
+        for name, value in self.headers:
+            key = 'HTTP_' + name.decode().upper().replace('-', '_')
+            environ[key] = value.decode()
+        return environ
+
+    def call(self, url):
+        result = {}
+
+        def start_response(status, headers, exc_info=None):
+            result['status'] = int(status.split()[0])
+
+        response = self.application(self.environ(url), start_response)
+        try:
+            b''.join(response)
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+        return result['status']
+
+    def run(self, concurrency, total):
+        lock = threading.Lock()
+        counter = iter(range(total))
+        timings, errors = [], 0
+
+        def client():
+            nonlocal errors
+            while True:
+                with lock:
+                    number = next(counter, None)
+                if number is None:
+                    return
+                url = self.urls[number % len(self.urls)]
+                started = time.perf_counter()
+                status = self.worker.submit(self.call, url).result()
+                duration = (time.perf_counter() - started) * 1000
+                with lock:
+                    timings.append(duration)
+                    errors += status != 200
+
+        started = time.perf_counter()
+        clients = [threading.Thread(target=client)
+                   for _ in range(concurrency)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return self.summary(concurrency, timings, errors,
+                            time.perf_counter() - started)
+
+
+class AsyncLoad(Load):
+    """Асинхронный воркер (uvicorn): ASGI-приложение в одном цикле."""
+
+    def __init__(self, urls, token=None):
+        super().__init__(urls, token)
+        self.application = get_asgi_application()
+
+    def scope(self, url):
+        parts = urlsplit(url)
+        return {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': parts.path,
+            'raw_path': parts.path.encode(),
+            'query_string': parts.query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'localhost')] + self.headers,
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+
+    async def call(self, url):
+        result = {}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                result['status'] = message['status']
+
+        await self.application(self.scope(url), receive, send)
+        return result['status']
+
+    async def load(self, concurrency, total):
+        counter = iter(range(total))
+        timings, errors = [], 0
+
+        async def client():
+            nonlocal errors
+            for number in counter:
+                url = self.urls[number % len(self.urls)]
+                started = time.perf_counter()
+                status = await self.call(url)
+                timings.append((time.perf_counter() - started) * 1000)
+                errors += status != 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return self.summary(concurrency, timings, errors,
+                            time.perf_counter() - started)
+
+    def run(self, concurrency, total):
+        return asyncio.run(self.load(concurrency, total))
@@ -0,0 +1,368 @@
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from api.asyncviews import add_execute_wrapper
+
+METRICS = (
+    ('requests_total', 'counter', 'Количество запросов.'),
+    ('request_duration_seconds', 'histogram', 'Время ответа, секунды.'),
+    ('db_queries_total', 'counter', 'Количество SQL-запросов.'),
+    ('db_query_duration_seconds_total', 'counter',
+     'Время SQL-запросов, секунды.'),
+    ('serializer_duration_seconds_total', 'counter',
+     'Время сериализации ответа, секунды.'),
+    ('response_size_bytes_total', 'counter', 'Размер ответов, байты.'),
+)
+PREFIX = 'foodgram_'
+LABELS = ('view', 'action', 'method')
+
+
+class Series:
+    """Значения метрик для одной тройки (view, action, method)."""
+
+    __slots__ = ('statuses', 'buckets', 'duration', 'queries',
+                 'query_duration', 'serializer_duration', 'size')
+
+    def __init__(self, buckets):
+        self.statuses = {}
+        self.buckets = [0] * (len(buckets) + 1)
+        self.duration = 0.0
+        self.queries = 0
+        self.query_duration = 0.0
+        self.serializer_duration = 0.0
+        self.size = 0
+
+    def dump(self):
+        return [self.statuses, self.buckets, self.duration, self.queries,
+                self.query_duration, self.serializer_duration, self.size]
+
+    def add(self, dumped):
+        statuses, buckets, *values = dumped
+        for status, count in statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.buckets = [a + b for a, b in zip(self.buckets, buckets)]
+        self.duration += values[0]
+        self.queries += values[1]
+        self.query_duration += values[2]
+        self.serializer_duration += values[3]
+        self.size += values[4]
+
+
+class MetricsRegistry:
+    """
+    Метрики запросов текущего процесса.
+
+    При заданном METRICS_DIR каждый процесс (воркер gunicorn) не чаще
+    раза в METRICS_FLUSH_INTERVAL секунд сбрасывает свои значения в
+    отдельный файл, а collect() суммирует файлы всех процессов, в том
+    числе завершившихся. Каталог нужно очищать при перезапуске сервиса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._series = {}
+        self._flushed = 0.0
+        self._atexit = False
+        self._path = None
+
+    @property
+    def buckets(self):
+        return tuple(settings.METRICS_BUCKETS)
+
+    def observe(self, labels, status, duration, queries, query_duration,
+                serializer_duration, size):
+        bucket = len(self.buckets)
+        for index, bound in enumerate(self.buckets):
+            if duration <= bound:
+                bucket = index
+                break
+
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = Series(self.buckets)
+            series.statuses[status] = series.statuses.get(status, 0) + 1
+            series.buckets[bucket] += 1
+            series.duration += duration
+            series.queries += queries
+            series.query_duration += query_duration
+            series.serializer_duration += serializer_duration
+            series.size += size
+
+        if time.monotonic() - self._flushed > settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def dump(self):
+        with self._lock:
+            return {
+                'buckets': list(self.buckets),
+                'series': [list(labels) + [series.dump()]
+                           for labels, series in self._series.items()],
+            }
+
+    def flush(self):
+        self._flushed = time.monotonic()
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+
+        if self._path is None:
+            os.makedirs(directory, exist_ok=True)
+            self._path = os.path.join(
+                directory, f'{os.getpid()}-{time.time_ns()}.json'
+            )
+        if not self._atexit:
+            atexit.register(self.flush)
+            self._atexit = True
+
+        with self._flush_lock:
+            temporary = f'{self._path}.tmp'
+            with open(temporary, 'w') as file:
+                json.dump(self.dump(), file)
+            os.replace(temporary, self._path)
+
+    def collect(self):
+        """Суммарные значения по всем процессам."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            dumps = [self.dump()]
+        else:
+            self.flush()
+            dumps = []
+            for name in os.listdir(directory):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(directory, name)) as file:
+                        dumps.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+
+        merged = {}
+        for dumped in dumps:
+            if tuple(dumped['buckets']) != self.buckets:
+                continue
+            for *labels, values in dumped['series']:
+                labels = tuple(labels)
+                if labels not in merged:
+                    merged[labels] = Series(self.buckets)
+                merged[labels].add(values)
+        return merged
+
+    def render(self):
+        """Текстовый формат Prometheus (exposition format 0.0.4)."""
+        merged = sorted(self.collect().items())
+        lines = []
+        for name, kind, description in METRICS:
+            lines.append(f'# HELP {PREFIX}{name} {description}')
+            lines.append(f'# TYPE {PREFIX}{name} {kind}')
+            for labels, series in merged:
+                lines.extend(self.render_series(name, labels, series))
+        return '\n'.join(lines) + '\n'
+
+    def render_series(self, name, labels, series):
+        metric = PREFIX + name
+
+        if name == 'requests_total':
+            return [
+                f'{metric}{format_labels(labels, status=status)} {count}'
+                for status, count in sorted(series.statuses.items())
+            ]
+
+        if name == 'request_duration_seconds':
+            lines = []
+            total = 0
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, series.buckets):
+                total += count
+                lines.append(f'{metric}_bucket'
+                             f'{format_labels(labels, le=bound)} {total}')
+            lines.append(f'{metric}_sum{format_labels(labels)} '
+                         f'{series.duration}')
+            lines.append(f'{metric}_count{format_labels(labels)} {total}')
+            return lines
+
+        value = {
+            'db_queries_total': series.queries,
+            'db_query_duration_seconds_total': series.query_duration,
+            'serializer_duration_seconds_total': series.serializer_duration,
+            'response_size_bytes_total': series.size,
+        }[name]
+        return [f'{metric}{format_labels(labels)} {value}']
+
+
+def format_labels(labels, **extra):
+    pairs = list(zip(LABELS, labels)) + list(extra.items())
+    return '{' + ','.join(
+        f'{name}="{escape(value)}"' for name, value in pairs
+    ) + '}'
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+metrics = MetricsRegistry()
+
+
+class RequestMetrics:
+    """Счётчики одного запроса: SQL-запросы и время сериализации."""
+
+    def __init__(self):
+        self.labels = ('unmatched', '')
+        self.queries = 0
+        self.query_duration = 0.0
+        self.serializer_duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_duration += time.perf_counter() - started
+
+    @contextmanager
+    def serialization(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.serializer_duration += time.perf_counter() - started
+
+    def timed(self, func):
+        def wrapper(*args, **kwargs):
+            with self.serialization():
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+@contextmanager
+def serialization(request):
+    """Засчитывает время блока как время сериализации запроса."""
+    request_metrics = getattr(request, 'metrics', None)
+    if request_metrics is None:
+        yield
+        return
+
+    with request_metrics.serialization():
+        yield
+
+
+class MetricsMiddleware:
+    """
+    Записывает метрики каждого запроса с метками view и action.
+
+    Для DRF-вьюсетов метки берутся из класса и действия (например,
+    RecipeViewSet и favorite), для остальных — из имени маршрута.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как в django.utils.deprecation.MiddlewareMixin.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        request.metrics = RequestMetrics()
+        started = time.perf_counter()
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(request.metrics))
+
+        try:
+            response = self.get_response(request)
+        except Exception:
+            stack.close()
+            raise
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, started,
+                stack
+            )
+        else:
+            stack.close()
+            self.observe(request, response, started, len(response.content))
+
+        return response
+
+    async def __acall__(self, request):
+        request.metrics = RequestMetrics()
+        started = time.perf_counter()
+        add_execute_wrapper(request, request.metrics)
+
+        response = await self.get_response(request)
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, started,
+                ExitStack()
+            )
+        else:
+            self.observe(request, response, started, len(response.content))
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is not None:
+            actions = getattr(view_func, 'actions', None) or {}
+            method = request.method.lower()
+            request.metrics.labels = (view_class.__name__,
+                                      actions.get(method, method))
+        else:
+            request.metrics.labels = (request.resolver_match.view_name, '')
+
+    def stream(self, request, response, content, started, stack):
+        size = 0
+        try:
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            stack.close()
+            self.observe(request, response, started, size)
+
+    def observe(self, request, response, started, size):
+        request_metrics = request.metrics
+        metrics.observe(
+            request_metrics.labels + (request.method,),
+            str(response.status_code),
+            time.perf_counter() - started,
+            request_metrics.queries,
+            request_metrics.query_duration,
+            request_metrics.serializer_duration,
+            size,
+        )
+
+
+class MetricsMixin:
+    """Учитывает время сериализаторов вьюсета в метриках запроса."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        request_metrics = getattr(self.request, 'metrics', None)
+
+        if request_metrics is not None:
+            serializer.to_representation = request_metrics.timed(
+                serializer.to_representation
+            )
+        return serializer
@@ -0,0 +1,161 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework import serializers
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+ESTIMATE_MIN_ROWS = 10000
+
+
+def estimate_table_rows(queryset):
+    connection = connections[queryset.db]
+
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+
+    return row[0] if row else None
+
+
+def approximate_count(queryset):
+    if not queryset.query.where:
+        estimate = estimate_table_rows(queryset)
+        if estimate is not None and estimate >= ESTIMATE_MIN_ROWS:
+            return estimate
+
+    signature = hashlib.md5(str(queryset.query).encode()).hexdigest()
+    key = f'count:{queryset.model._meta.label_lower}:{signature}'
+    count = cache.get(key)
+
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.APPROXIMATE_COUNT_TIMEOUT)
+
+    return count
+
+
+class ApproximateCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        return approximate_count(self.object_list)
+
+
+class ApproximateCountPagination(PageNumberPagination):
+    django_paginator_class = ApproximateCountPaginator
+
+
+class RecipeCursorPagination(CursorPagination):
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        if queryset.query.order_by:
+            return tuple(queryset.query.order_by)
+
+        return super().get_ordering(request, queryset, view)
+
+
+class SubscriptionCursorPagination(CursorPagination):
+    ordering = '-id'
+
+
+class UserCursorPagination(CursorPagination):
+    ordering = 'id'
+
+
+class PaginationModeMixin:
+    """
+    Позволяет клиенту выбрать режим пагинации параметрами запроса:
+    ?pagination=cursor - курсорная пагинация без COUNT(*) и OFFSET,
+    ?count=approximate - постраничная с приблизительным количеством.
+    """
+
+    cursor_pagination_class = None
+    approximate_pagination_class = ApproximateCountPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.get_pagination_class()
+            self._paginator = pagination_class() if pagination_class else None
+        return self._paginator
+
+    def get_pagination_class(self):
+        params = self.request.query_params
+
+        if (params.get('pagination') == 'cursor'
+                and self.cursor_pagination_class is not None):
+            return self.cursor_pagination_class
+
+        if (params.get('count') == 'approximate'
+                and self.pagination_class is not None):
+            return self.approximate_pagination_class
+
+        return self.pagination_class
+
+
+class FeedPagination(BasePagination):
+    """
+    Keyset-пагинация ленты: ?before=<id>&limit=N, следующая страница —
+    рецепты с id меньше последнего на текущей.
+    """
+
+    before_query_param = 'before'
+    limit_query_param = 'limit'
+
+    def get_limit(self, request):
+        limit = request.query_params.get(self.limit_query_param)
+        if limit is None:
+            return settings.REST_FRAMEWORK['PAGE_SIZE']
+        try:
+            limit = serializers.IntegerField(
+                min_value=1, max_value=settings.RECIPES_LIMIT_MAX
+            ).run_validation(limit)
+        except serializers.ValidationError as error:
+            raise serializers.ValidationError(
+                {self.limit_query_param: error.detail})
+        return limit
+
+    def get_before(self, request):
+        before = request.query_params.get(self.before_query_param)
+        if before is None:
+            return None
+        try:
+            return serializers.IntegerField(min_value=1).run_validation(
+                before)
+        except serializers.ValidationError as error:
+            raise serializers.ValidationError(
+                {self.before_query_param: error.detail})
+
+    def paginate_ids(self, request, ids_for):
+        self.request = request
+        self.limit = self.get_limit(request)
+        ids = ids_for(self.get_before(request), self.limit + 1)
+        self.next_before = None
+        if len(ids) > self.limit:
+            self.next_before = ids[self.limit - 1]
+        return ids[:self.limit]
+
+    def get_next_link(self):
+        if self.next_before is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.before_query_param,
+                                   self.next_before)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
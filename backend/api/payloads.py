@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import threading
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from recipe.replicas import primary
+from recipe.versions import get_version
+
+
+class Payload:
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.gzip_body = gzip.compress(body)
+        digest = hashlib.sha1(body).hexdigest()
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+    def response(self, request):
+        use_gzip = accepts_gzip(request)
+        etag = self.gzip_etag if use_gzip else self.etag
+
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                self.gzip_body if use_gzip else self.body,
+                content_type='application/json'
+            )
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+
+
+def accepts_gzip(request):
+    """
+    Разбирает Accept-Encoding с учётом q: 'gzip;q=0' — явный отказ,
+    '*' подходит, только если gzip не указан отдельно.
+    """
+    qualities = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = (part.strip() for part in item.split(';'))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+
+    quality = qualities.get('gzip', qualities.get('*', 0.0))
+    return quality > 0
+
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+
+    if not if_none_match:
+        return False
+
+    tags = {tag.strip() for tag in if_none_match.split(',')}
+    return '*' in tags or etag in tags
+
+
+class PayloadCache:
+    """
+    Готовые JSON-ответы (и их gzip-версии) для неизменяемых списков.
+
+    Каждый ответ привязан к версии данных из recipe.versions и лениво
+    пересобирается после её изменения. Версии сбрасывают сигналы моделей
+    и явно load_csv (bulk_create сигналов не вызывает). Другие воркеры
+    видят новую версию через общий кеш, а с кешем в памяти процесса —
+    не позже VERSION_LOCAL_TIMEOUT секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._payloads = {}
+
+    def get(self, name, build):
+        version = get_version(name)
+        payload = self._payloads.get(name)
+
+        if payload is None or payload.version != version:
+            with self._lock:
+                payload = self._payloads.get(name)
+                if payload is None or payload.version != version:
+                    # Версия уже новая: собираем из основной базы, чтобы
+                    # не закешировать под ней данные отстающей реплики.
+                    with primary():
+                        data = build()
+                    body = JSONRenderer().render(data)
+                    payload = Payload(version, body)
+                    self._payloads[name] = payload
+
+        return payload
+
+
+payload_cache = PayloadCache()
+
+
+class CachedListMixin:
+    payload_name = None
+
+    def is_payload_cacheable(self, request):
+        filtered = any(value for key, value in request.query_params.items()
+                       if key != 'format')
+        return request.accepted_renderer.format == 'json' and not filtered
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_payload_cacheable(request):
+            return super().list(request, *args, **kwargs)
+
+        payload = payload_cache.get(
+            self.payload_name,
+            lambda: self.get_serializer(
+                self.filter_queryset(self.get_queryset()), many=True
+            ).data
+        )
+        return payload.response(request)
@@ -0,0 +1,93 @@
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from recipe.models import Favorite, ShoppingCart, Subscribe
+from recipe.versions import bump_version, get_version
+
+RELATIONS = {
+    'favorites': (Favorite, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+    'following': (Subscribe, 'author_id'),
+}
+
+
+class UserRelations:
+    """
+    Множества id избранных рецептов, рецептов в списке покупок и авторов,
+    на которых подписан пользователь.
+
+    Каждое множество загружается одним запросом при первом обращении и
+    живёт до конца запроса. При RELATIONS_CACHE_TIMEOUT > 0 множества
+    дополнительно хранятся в кэше Django под ключом с версией, которую
+    сбрасывает invalidate_relations.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._sets = {}
+
+    @property
+    def favorites(self):
+        return self.get('favorites')
+
+    @property
+    def shopping_cart(self):
+        return self.get('shopping_cart')
+
+    @property
+    def following(self):
+        return self.get('following')
+
+    def get(self, name):
+        if name not in self._sets:
+            self._sets[name] = self._load(name)
+        return self._sets[name]
+
+    def discard(self, name):
+        self._sets.pop(name, None)
+
+    def _load(self, name):
+        if not self.user.is_authenticated:
+            return frozenset()
+
+        timeout = settings.RELATIONS_CACHE_TIMEOUT
+        if not timeout:
+            return frozenset(self._query(name))
+
+        version = get_version('relations', self.user.id, name)
+        key = f'relations:{self.user.id}:{name}:{version}'
+        ids = cache.get(key)
+        if ids is None:
+            ids = array('q', sorted(self._query(name)))
+            cache.set(key, ids, timeout=timeout)
+        return frozenset(ids)
+
+    def _query(self, name):
+        model, field = RELATIONS[name]
+        return model.objects.filter(user=self.user).values_list(field,
+                                                                flat=True)
+
+
+def get_relations(request):
+    django_request = getattr(request, '_request', request)
+    relations = getattr(django_request, 'user_relations', None)
+
+    if relations is None or relations.user != request.user:
+        relations = UserRelations(request.user)
+        django_request.user_relations = relations
+
+    return relations
+
+
+def invalidate_relations(request, name):
+    """
+    Версия меняется после коммита: иначе параллельный запрос мог бы
+    закешировать незакоммиченное состояние под новой версией.
+    """
+    user_id = request.user.id
+    transaction.on_commit(
+        lambda: bump_version('relations', user_id, name))
+    get_relations(request).discard(name)
@@ -0,0 +1,72 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ExportRenderer(BaseRenderer):
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if isinstance(data, bytes):
+            return data
+
+        if isinstance(data, dict) and 'detail' in data:
+            data = data['detail']
+
+        return str(data).encode('utf-8')
+
+
+class PlainTextRenderer(ExportRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(ExportRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson, если он установлен.
+
+    Для компактного вывода результат совпадает с JSONRenderer байт в байт
+    (кроме записи чисел с плавающей точкой в экспоненциальной форме).
+    С отступами и без orjson работает обычный JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if (orjson is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=JSONEncoder().default,
+                option=(orjson.OPT_NON_STR_KEYS
+                        | orjson.OPT_PASSTHROUGH_DATETIME)
+            )
+        except orjson.JSONEncodeError:
+            # Например, целые больше 64 бит.
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return (ret.replace(b'\xe2\x80\xa8', b'\\u2028')
+                .replace(b'\xe2\x80\xa9', b'\\u2029'))
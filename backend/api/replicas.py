@@ -0,0 +1,35 @@
+from rest_framework.permissions import SAFE_METHODS
+
+from recipe.replicas import (choose_replica, is_pinned, pin_to_primary,
+                             read_database, reading_from)
+
+
+class ReplicaReadMixin:
+    """
+    Безопасные запросы вьюсета читают с реплики, если пользователь
+    недавно ничего не менял. Успешный небезопасный запрос закрепляет
+    пользователя за основной базой.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with reading_from(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        if request.method not in SAFE_METHODS:
+            return
+
+        replica = choose_replica()
+        user = request.user
+        if replica is not None and not (user.is_authenticated
+                                        and is_pinned(request, user.id)):
+            read_database.set(replica)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and request.user.is_authenticated):
+            pin_to_primary(response, request.user.id)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,11 +1,24 @@
+from collections import Counter, defaultdict
+
 from rest_framework import serializers
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 
+from api.fields import ImageVariantsField
+from api.relations import get_relations
+from recipe.images import schedule_image_variants
+from recipe.pantry import record_changes
 from recipe.models import (Ingredient, Recipe, Tag, Subscribe,
                            IngredientRecipe)
+from recipe.search import update_search_vectors
+from recipe.shopping_list import update_recipe_in_shopping_lists
+from recipe.similar import update_similar
+from recipe.versions import bump_version
 
 User = get_user_model()
 
@@ -19,14 +32,12 @@ class CustomUserSerializer(UserSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
+        is_subscribed = getattr(obj, 'is_subscribed', None)
 
-        if user.is_authenticated:
-            user = user.id
-            author = obj.id
-            return Subscribe.objects.filter(user=user, author=author).exists()
+        if is_subscribed is not None:
+            return is_subscribed
 
-        return False
+        return obj.id in get_relations(self.context['request']).following
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -39,10 +50,42 @@ class CustomUserCreateSerializer(UserCreateSerializer):
 
 class FollowOrShoppingCartSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+
+class PantryRecipeSerializer(FollowOrShoppingCartSerializer):
+    matched = serializers.IntegerField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(FollowOrShoppingCartSerializer.Meta):
+        fields = FollowOrShoppingCartSerializer.Meta.fields + (
+            'matched', 'missing', 'coverage'
+        )
+
+
+class PantrySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=settings.PANTRY_INGREDIENTS_MAX
+    )
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.RECIPES_LIMIT_MAX,
+        default=settings.REST_FRAMEWORK['PAGE_SIZE']
+    )
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=settings.RECIPES_BATCH_MAX
+    )
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -79,38 +122,46 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                                                   many=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_variants',
+                  'text', 'cooking_time', 'favorites_count')
         read_only_fields = ('id', 'tags', 'author', 'ingredients',
                             'is_favorited', 'is_in_shopping_cart', 'name',
-                            'image', 'text', 'cooking_time')
+                            'image', 'text', 'cooking_time',
+                            'favorites_count')
+
+    def to_representation(self, instance):
+        is_subscribed = getattr(instance, 'is_author_subscribed', None)
+
+        if is_subscribed is not None:
+            instance.author.is_subscribed = is_subscribed
+
+        return super().to_representation(instance)
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
+        is_favorited = getattr(obj, 'is_favorited', None)
 
-        if user.is_authenticated:
-            return obj.favorite.filter(user=user).exists()
+        if is_favorited is not None:
+            return is_favorited
 
-        return False
+        return obj.id in get_relations(self.context['request']).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
 
-        if user.is_authenticated:
-            return obj.shoppingcart.filter(user=user).exists()
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
 
-        return False
+        relations = get_relations(self.context['request'])
+        return obj.id in relations.shopping_cart
 
 
 class IngredientsInRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient',
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(source='ingredient', min_value=1)
     amount = serializers.IntegerField(min_value=1, max_value=1000)
 
     class Meta:
@@ -118,12 +169,20 @@ class IngredientsInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+def resolve_objects(model, ids):
+    if not ids:
+        return {}, []
+
+    objects = model.objects.in_bulk(set(ids))
+    missing = sorted(set(ids) - set(objects))
+    return objects, missing
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField(max_length=None, use_url=True)
     cooking_time = serializers.IntegerField(min_value=1, max_value=1000)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = serializers.ListField(child=serializers.IntegerField(min_value=1))
     ingredients = IngredientsInRecipeSerializer(many=True)
 
     class Meta:
@@ -133,10 +192,9 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'author', 'tags', )
 
     def validate_ingredients(self, data):
-        ingredients = self.initial_data.get('ingredients')
-        ingredients_list = [ingredient['id'] for ingredient in ingredients]
+        ingredients_list = [ingredient['ingredient'] for ingredient in data]
 
-        if not ingredients:
+        if not data:
             raise serializers.ValidationError('Поле не может быть пустым')
 
         if len(ingredients_list) != len(set(ingredients_list)):
@@ -152,9 +210,45 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
         return tags
 
+    def validate(self, attrs):
+        # Теги и ингредиенты достаются одним запросом на модель,
+        # обо всех несуществующих id сообщаем сразу.
+        errors = {}
+        tag_ids = attrs.get('tags', [])
+        tags, missing = resolve_objects(Tag, tag_ids)
+        if missing:
+            errors['tags'] = self.missing_error('теги', missing)
+
+        ingredient_ids = [ingredient['ingredient']
+                          for ingredient in attrs.get('ingredients', [])]
+        ingredients, missing = resolve_objects(Ingredient, ingredient_ids)
+        if missing:
+            errors['ingredients'] = self.missing_error('ингредиенты',
+                                                       missing)
+
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        if 'tags' in attrs:
+            attrs['tags'] = [tags[pk] for pk in dict.fromkeys(tag_ids)]
+        for ingredient in attrs.get('ingredients', []):
+            ingredient['ingredient'] = ingredients[ingredient['ingredient']]
+        return attrs
+
+    @staticmethod
+    def missing_error(name, missing):
+        return 'Несуществующие {}: {}.'.format(
+            name, ', '.join(str(pk) for pk in missing)
+        )
+
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        prefetch_related_objects(
+            [instance], 'tags',
+            Prefetch('ingredient_recipe',
+                     IngredientRecipe.objects.select_related('ingredient'))
+        )
         return RecipeReadSerializer(instance, context=context).data
 
     def create(self, validated_data):
@@ -169,27 +263,136 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             ingredient=ingredient['ingredient']
             ) for ingredient in ingredients]
         IngredientRecipe.objects.bulk_create(recipe_create)
+        # Сигналов по составу нет: производные данные пересчитываются здесь.
+        record_changes([recipe.id])
+        update_search_vectors([recipe.id])
+        update_similar(recipe.id)
+        schedule_image_variants(recipe)
+        bump_version('recipes')
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
-        ingredients = validated_data.pop('ingredients')
-
-        ingredients_in_data = IngredientRecipe.objects.filter(
-            recipe__id=instance.id)
-        ingredients_in_data.delete()
-
-        recipe_update = [IngredientRecipe(
-            recipe=instance,
-            amount=ingredient['amount'],
-            ingredient=ingredient['ingredient']
-        ) for ingredient in ingredients]
-        IngredientRecipe.objects.bulk_create(recipe_update)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+
+        if tags is not None:
+            self.update_tags(instance, tags)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+
+        changed = [
+            field for field, value in validated_data.items()
+            if field == 'image' or getattr(instance, field) != value
+        ]
+        for field in changed:
+            setattr(instance, field, validated_data[field])
+        if 'image' in changed:
+            instance.image_variants = {}
+            changed.append('image_variants')
+
+        if changed:
+            instance.save(update_fields=changed)
+        if 'image' in changed:
+            schedule_image_variants(instance)
 
         return instance
 
+    def update_tags(self, instance, tags):
+        current = set(instance.tags.values_list('id', flat=True))
+        submitted = {tag.id for tag in tags}
+
+        if current == submitted:
+            return
+
+        if current - submitted:
+            instance.tags.remove(*(current - submitted))
+        if submitted - current:
+            instance.tags.add(*(submitted - current))
+        update_similar(instance.id)
+        bump_version('recipes')
+
+    def update_ingredients(self, instance, ingredients):
+        """Применяет только разницу между текущим и новым составом."""
+        submitted = {
+            ingredient['ingredient'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {}
+        deleted = []
+        old_amounts = Counter()
+        for row in instance.ingredient_recipe.all():
+            old_amounts[row.ingredient_id] += row.amount
+            if row.ingredient_id in current:
+                deleted.append(row.id)
+            else:
+                current[row.ingredient_id] = row
+
+        updated = []
+        for ingredient_id, row in current.items():
+            if ingredient_id not in submitted:
+                deleted.append(row.id)
+            elif row.amount != submitted[ingredient_id]:
+                row.amount = submitted[ingredient_id]
+                updated.append(row)
+        created = [
+            IngredientRecipe(recipe=instance, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in submitted.items()
+            if ingredient_id not in current
+        ]
+
+        if not (deleted or updated or created):
+            return
+
+        if deleted:
+            IngredientRecipe.objects.filter(id__in=deleted).delete()
+        if updated:
+            IngredientRecipe.objects.bulk_update(updated, ['amount'])
+        if created:
+            IngredientRecipe.objects.bulk_create(created)
+
+        update_recipe_in_shopping_lists(instance.id, old_amounts,
+                                        Counter(submitted))
+        if created or current.keys() - submitted.keys():
+            record_changes([instance.id])
+            update_search_vectors([instance.id])
+            update_similar(instance.id)
+        bump_version('recipes')
+
+
+def get_recipes_limit(request):
+    limit = request.query_params.get('recipes_limit')
+
+    if limit in (None, ''):
+        return settings.RECIPES_LIMIT_MAX
+
+    field = serializers.IntegerField(min_value=0)
+    try:
+        limit = field.run_validation(limit)
+    except serializers.ValidationError as error:
+        raise serializers.ValidationError({'recipes_limit': error.detail})
+
+    return min(limit, settings.RECIPES_LIMIT_MAX)
+
+
+class SubscribeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        subscriptions = list(data)
+        limit = get_recipes_limit(self.context['request'])
+        recipes = defaultdict(list)
+
+        for recipe in Recipe.objects.top_per_author(
+                {obj.author_id for obj in subscriptions}, limit):
+            recipes[recipe.author_id].append(recipe)
+
+        for obj in subscriptions:
+            obj.author_recipes = recipes[obj.author_id]
+
+        return super().to_representation(subscriptions)
+
 
 class SubscribeSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='author.id', read_only=True)
@@ -202,14 +405,14 @@ class SubscribeSerializer(serializers.ModelSerializer):
                                       read_only=True)
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='author.recipe.count', read_only=True
-    )
+    recipes_count = serializers.IntegerField(source='author.recipes_count',
+                                             read_only=True)
 
     class Meta:
         model = Subscribe
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count')
+        list_serializer_class = SubscribeListSerializer
 
     def validate(self, attrs):
         user = self.context['request'].user.id
@@ -229,13 +432,13 @@ class SubscribeSerializer(serializers.ModelSerializer):
         return attrs
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = obj.author.recipes.all()
-        if limit:
-            queryset = queryset[:int(limit)]
-        return FollowOrShoppingCartSerializer(queryset, many=True).data
+        recipes = getattr(obj, 'author_recipes', None)
+
+        if recipes is None:
+            limit = get_recipes_limit(self.context['request'])
+            recipes = obj.author.recipes.all()[:limit]
+
+        return FollowOrShoppingCartSerializer(recipes, many=True).data
 
     def get_is_subscribed(self, obj):
-        return Subscribe.objects.filter(author_id=obj.author_id,
-                                        user_id=obj.user_id).exists()
+        return True
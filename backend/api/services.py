@@ -0,0 +1,149 @@
+from django.db import connection, transaction
+
+from api.relations import invalidate_relations
+from recipe.counters import change_counters
+from recipe.models import Favorite, Recipe, ShoppingCart
+from recipe.shopping_list import (add_to_shopping_list,
+                                  remove_from_shopping_list)
+
+CREATED = 'created'
+EXISTS = 'exists'
+REMOVED = 'removed'
+MISSING = 'missing'
+NOT_FOUND = 'not_found'
+
+RECIPE_FIELDS = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+
+class RecipeCollection:
+    """
+    Избранное или список покупок пользователя.
+
+    Добавляет и удаляет сразу несколько рецептов: на PostgreSQL одной
+    командой INSERT ... ON CONFLICT DO NOTHING / DELETE ... RETURNING,
+    и возвращает статус для каждого id.
+    """
+
+    def __init__(self, model, relation):
+        self.model = model
+        self.relation = relation
+
+    def add(self, request, recipe_ids):
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                recipes, created = self._insert_returning(request.user,
+                                                          recipe_ids)
+            else:
+                recipes, created = self._insert(request.user, recipe_ids)
+            if created:
+                self.added(request.user, created)
+                invalidate_relations(request, self.relation)
+
+        statuses = {
+            pk: (NOT_FOUND if pk not in recipes
+                 else CREATED if pk in created else EXISTS)
+            for pk in recipe_ids
+        }
+        return statuses, recipes
+
+    def remove(self, request, recipe_ids):
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                removed = self._delete_returning(request.user, recipe_ids)
+            else:
+                removed = self._delete(request.user, recipe_ids)
+            if removed:
+                self.removed(request.user, removed)
+                invalidate_relations(request, self.relation)
+
+        missing = [pk for pk in recipe_ids if pk not in removed]
+        existing = set(
+            Recipe.objects.filter(id__in=missing).values_list('id',
+                                                              flat=True)
+        ) if missing else set()
+
+        return {
+            pk: (REMOVED if pk in removed
+                 else MISSING if pk in existing else NOT_FOUND)
+            for pk in recipe_ids
+        }
+
+    def added(self, user, recipe_ids):
+        pass
+
+    def removed(self, user, recipe_ids):
+        pass
+
+    def _insert_returning(self, user, recipe_ids):
+        table = self.model._meta.db_table
+        columns = ', '.join(f'recipe.{field}' for field in RECIPE_FIELDS)
+        recipes = Recipe.objects.raw(
+            f'WITH inserted AS ('
+            f'INSERT INTO {table} (user_id, recipe_id) '
+            f'SELECT %s, id FROM {Recipe._meta.db_table} '
+            f'WHERE id = ANY(%s) '
+            f'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+            f'RETURNING recipe_id) '
+            f'SELECT {columns}, inserted.recipe_id IS NOT NULL AS created '
+            f'FROM {Recipe._meta.db_table} AS recipe '
+            f'LEFT JOIN inserted ON inserted.recipe_id = recipe.id '
+            f'WHERE recipe.id = ANY(%s)',
+            [user.id, recipe_ids, recipe_ids]
+        )
+        recipes = {recipe.id: recipe for recipe in recipes}
+        created = {pk for pk, recipe in recipes.items() if recipe.created}
+        return recipes, created
+
+    def _insert(self, user, recipe_ids):
+        recipes = Recipe.objects.only(*RECIPE_FIELDS).in_bulk(recipe_ids)
+        existing = set(
+            self.model.objects.filter(user=user, recipe_id__in=recipes)
+            .values_list('recipe_id', flat=True)
+        )
+        created = set(recipes) - existing
+        self.model.objects.bulk_create(
+            [self.model(user=user, recipe_id=pk) for pk in created],
+            ignore_conflicts=True
+        )
+        return recipes, created
+
+    def _delete_returning(self, user, recipe_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.model._meta.db_table} '
+                f'WHERE user_id = %s AND recipe_id = ANY(%s) '
+                f'RETURNING recipe_id',
+                [user.id, recipe_ids]
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def _delete(self, user, recipe_ids):
+        queryset = self.model.objects.filter(user=user,
+                                             recipe_id__in=recipe_ids)
+        removed = set(queryset.values_list('recipe_id', flat=True))
+        queryset.delete()
+        return removed
+
+
+class Favorites(RecipeCollection):
+
+    def added(self, user, recipe_ids):
+        change_counters(Recipe, recipe_ids, 'favorites_count', 1)
+
+    def removed(self, user, recipe_ids):
+        change_counters(Recipe, recipe_ids, 'favorites_count', -1)
+
+
+class ShoppingCartCollection(RecipeCollection):
+
+    def added(self, user, recipe_ids):
+        add_to_shopping_list(user.id, recipe_ids)
+
+    def removed(self, user, recipe_ids):
+        remove_from_shopping_list(user.id, recipe_ids)
+
+
+favorites = Favorites(Favorite, 'favorites')
+shopping_cart = ShoppingCartCollection(ShoppingCart, 'shopping_cart')
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from api.asyncviews import add_execute_wrapper
+
+logger = logging.getLogger('foodgram.sql')
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r'\?(?:\s*,\s*\?)+')
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE', 'ROLLBACK', 'BEGIN',
+                          'COMMIT')
+
+
+def query_shape(sql):
+    """SQL без параметров и литералов: одинаковая форма у запросов цикла."""
+    shape = LITERALS.sub('?', sql.replace('%s', '?'))
+    return PLACEHOLDER_LISTS.sub('?, ...', shape)
+
+
+class SQLProfiler:
+    """
+    Записывает SQL-запросы блока на всех подключениях.
+
+    После выхода из блока findings() возвращает повторяющиеся формы
+    запросов (признак N+1) и медленные запросы с планом EXPLAIN.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((context['connection'].alias, sql, params,
+                                 time.perf_counter() - started))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._stack is not None:
+            self._stack.close()
+
+    def statements(self):
+        """Запросы без управления транзакциями и точками сохранения."""
+        return [
+            query for query in self.queries
+            if not query[1].lstrip().upper().startswith(
+                TRANSACTION_STATEMENTS)
+        ]
+
+    def repeated(self):
+        shapes = defaultdict(lambda: [0, 0.0])
+        for _, sql, _, duration in self.statements():
+            shape = shapes[query_shape(sql)]
+            shape[0] += 1
+            shape[1] += duration
+
+        threshold = settings.SQL_PROFILER_REPEAT_THRESHOLD
+        return sorted(
+            ((shape, count, duration)
+             for shape, (count, duration) in shapes.items()
+             if count >= threshold),
+            key=lambda item: -item[1]
+        )
+
+    def slow(self):
+        threshold = settings.SQL_PROFILER_SLOW_MS / 1000
+        return sorted(
+            (query for query in self.statements() if query[3] >= threshold),
+            key=lambda query: -query[3]
+        )
+
+    def findings(self):
+        findings = [
+            {'kind': 'repeated', 'count': count,
+             'duration_ms': round(duration * 1000, 3), 'sql': shape}
+            for shape, count, duration in self.repeated()
+        ]
+
+        for number, (alias, sql, params, duration) in enumerate(self.slow()):
+            finding = {'kind': 'slow', 'database': alias,
+                       'duration_ms': round(duration * 1000, 3), 'sql': sql}
+            if number < settings.SQL_PROFILER_MAX_EXPLAINS:
+                finding['explain'] = explain(alias, sql, params)
+            findings.append(finding)
+
+        return findings
+
+
+def explain(alias, sql, params):
+    """
+    План запроса. EXPLAIN ANALYZE выполняет запрос повторно, поэтому
+    используется только для SELECT и только на PostgreSQL.
+    """
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS)'
+    elif connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN'
+    else:
+        prefix = 'EXPLAIN'
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return '\n'.join(
+                ' '.join(str(column) for column in row)
+                for row in cursor.fetchall()
+            )
+    except Exception as error:
+        return f'EXPLAIN не выполнен: {error}'
+
+
+class SQLProfilerMiddleware:
+    """
+    Профилирует SQL в доле запросов SQL_PROFILER_SAMPLE_RATE и пишет
+    находки (N+1 и медленные запросы с планом) в логгер foodgram.sql.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как в django.utils.deprecation.MiddlewareMixin.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    @staticmethod
+    def sampled():
+        rate = settings.SQL_PROFILER_SAMPLE_RATE
+        return rate and random.random() < rate
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        if not self.sampled():
+            return self.get_response(request)
+
+        profiler = SQLProfiler().__enter__()
+        try:
+            response = self.get_response(request)
+        except Exception:
+            profiler.__exit__(None, None, None)
+            raise
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response.streaming_content, profiler
+            )
+        else:
+            self.finish(request, profiler)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        profiler = SQLProfiler()
+        add_execute_wrapper(request, profiler)
+        response = await self.get_response(request)
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response.streaming_content, profiler
+            )
+        else:
+            # EXPLAIN обращается к базе, поэтому не в цикле событий.
+            await sync_to_async(self.finish)(request, profiler)
+        return response
+
+    def stream(self, request, content, profiler):
+        try:
+            yield from content
+        finally:
+            self.finish(request, profiler)
+
+    def finish(self, request, profiler):
+        profiler.__exit__(None, None, None)
+        findings = profiler.findings()
+        if not findings:
+            return
+
+        request_metrics = getattr(request, 'metrics', None)
+        view = ('.'.join(part for part in request_metrics.labels if part)
+                if request_metrics is not None else '')
+        for finding in findings:
+            finding.update(method=request.method, path=request.path,
+                           view=view, queries=len(profiler.queries))
+            logger.warning(json.dumps(finding, ensure_ascii=False))
@@ -0,0 +1,24 @@
+from django.test import RequestFactory, SimpleTestCase
+
+from api.payloads import accepts_gzip
+
+
+class AcceptsGzipTest(SimpleTestCase):
+
+    def test_accept_encoding(self):
+        cases = {
+            '': False,
+            'gzip': True,
+            'deflate, gzip;q=0.5': True,
+            'gzip;q=0': False,
+            'gzip; q=0.0, deflate': False,
+            'br, *': True,
+            '*;q=0': False,
+            'gzip;q=0, *': False,
+            'x-gzip': False,
+        }
+        factory = RequestFactory()
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                request = factory.get('/', HTTP_ACCEPT_ENCODING=header)
+                self.assertIs(accepts_gzip(request), expected)
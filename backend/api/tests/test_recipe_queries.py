@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipe.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                           ShoppingCart, Subscribe, Tag)
+
+User = get_user_model()
+
+
+class RecipeQueriesTest(TestCase):
+    """
+    Число SQL-запросов списка и страницы рецепта не зависит от числа
+    рецептов на странице.
+    """
+
+    LIST_QUERIES = {'anonymous': 4, 'authenticated': 4}
+    RETRIEVE_QUERIES = {'anonymous': 3, 'authenticated': 3}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        Subscribe.objects.create(user=cls.reader, author=cls.author)
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                               slug=f'tag-{number}')
+            for number in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(3)
+        ]
+
+    @classmethod
+    def create_recipes(cls, count):
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {number}', author=cls.author, text='Текст',
+                image='recipe_images/recipe.png', cooking_time=10
+            )
+            recipe.tags.set(cls.tags)
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=5)
+                for ingredient in cls.ingredients
+            )
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+        return recipe
+
+    def clients(self):
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.reader)
+        return {'anonymous': APIClient(), 'authenticated': authenticated}
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        for recipes_count, page_size in ((1, 1), (6, 6)):
+            Recipe.objects.all().delete()
+            self.create_recipes(recipes_count)
+            for name, client in self.clients().items():
+                with self.subTest(user=name, page_size=page_size):
+                    with self.assertNumQueries(self.LIST_QUERIES[name]):
+                        response = client.get('/api/recipes/')
+                    self.assertEqual(len(response.data['results']),
+                                     page_size)
+
+    def test_retrieve_queries(self):
+        recipe = self.create_recipes(1)
+        for name, client in self.clients().items():
+            with self.subTest(user=name):
+                with self.assertNumQueries(self.RETRIEVE_QUERIES[name]):
+                    response = client.get(f'/api/recipes/{recipe.id}/')
+                self.assertEqual(response.status_code, 200)
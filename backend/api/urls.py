@@ -1,8 +1,11 @@
+from django.conf import settings
 from django.urls import include, re_path, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import (IngredientsViewSet, RecipeViewSet, TagsViewSet,
-                       SubscriptionsViewSet, SubscribeViewSet, UsersViewSet)
+from api.asyncviews import async_urls
+from api.views import (IngredientsViewSet, MetricsView, RecipeViewSet,
+                       TagsViewSet, SubscriptionsViewSet, SubscribeViewSet,
+                       UsersViewSet)
 
 router_v1 = DefaultRouter()
 
@@ -20,7 +23,15 @@ router_v1.register(
 router_v1.register('users', UsersViewSet, basename='users')
 
 
+router_urls = router_v1.urls
+if settings.ASYNC_READ_PATH:
+    router_urls = async_urls(
+        router_urls, (RecipeViewSet, TagsViewSet, IngredientsViewSet)
+    )
+
+
 urlpatterns = [
-    path('', include(router_v1.urls)),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('', include(router_urls)),
     re_path(r'^auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,70 +1,116 @@
-from rest_framework import viewsets, status
+from rest_framework import serializers, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.mixins import (ListModelMixin, RetrieveModelMixin,
                                    CreateModelMixin, DestroyModelMixin)
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import (AllowAny, IsAuthenticatedOrReadOnly,
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticatedOrReadOnly,
                                         IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.http import (Http404, HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 
+from api import services
+from api.exports import ShoppingListExport
+from api.fastread import FastReadMixin, recipe_reader
 from api.filters import RecipeFilter, IngredientFilter
+from api.ingredient_index import ingredient_index
+from api.metrics import MetricsMixin, metrics
+from api.pagination import (FeedPagination, PaginationModeMixin,
+                            RecipeCursorPagination,
+                            SubscriptionCursorPagination, UserCursorPagination)
+from api.payloads import CachedListMixin, etag_matches
 from api.permissions import IsAuthorOrAdminOrReadOnly
-from api.serializers import (IngredientSerializer, RecipeReadSerializer,
-                             RecipeWriteSerializer, SubscribeSerializer,
-                             TagSerializer, FollowOrShoppingCartSerializer)
-from recipe.models import (Recipe, Subscribe, Tag, Ingredient, Favorite,
-                           ShoppingCart, IngredientRecipe)
+from api.relations import invalidate_relations
+from api.replicas import ReplicaReadMixin
+from api.renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from api.serializers import (IngredientSerializer, PantryRecipeSerializer,
+                             PantrySerializer, RecipeBatchSerializer,
+                             RecipeReadSerializer, RecipeWriteSerializer,
+                             SubscribeSerializer, TagSerializer,
+                             FollowOrShoppingCartSerializer)
+from recipe.counters import change_counter
+from recipe.lifecycle import delete_recipe, recipe_created
+from recipe.models import Recipe, SimilarRecipe, Subscribe, Tag, Ingredient
+from recipe.pantry import pantry_index
+from recipe.timeline import feed_ids, follow, unfollow
 
 User = get_user_model()
 
 
-class UsersViewSet(UserViewSet):
+class UsersViewSet(MetricsMixin, ReplicaReadMixin, PaginationModeMixin,
+                   UserViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    cursor_pagination_class = UserCursorPagination
+
+    def get_queryset(self):
+        return super().get_queryset().order_by('id')
 
 
-class SubscribeViewSet(viewsets.GenericViewSet, CreateModelMixin,
-                       DestroyModelMixin):
+class SubscribeViewSet(MetricsMixin, ReplicaReadMixin,
+                       viewsets.GenericViewSet,
+                       CreateModelMixin, DestroyModelMixin):
     serializer_class = SubscribeSerializer
     permission_classes = (IsAuthenticated,)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         user = self.request.user
         author = get_object_or_404(User, pk=self.kwargs.get('id'))
         serializer.save(user=user, author=author)
+        change_counter(User, author.id, 'followers_count', 1)
+        follow(user.id, author.id)
+        invalidate_relations(self.request, 'following')
 
     def delete(self, request, *args, **kwargs):
         user = self.request.user
         author = get_object_or_404(User, pk=self.kwargs.get('id'))
-        follow = get_object_or_404(Subscribe, user=user, author=author)
-        follow.delete()
+        subscription = get_object_or_404(Subscribe, user=user, author=author)
+        with transaction.atomic():
+            subscription.delete()
+            change_counter(User, author.id, 'followers_count', -1)
+            unfollow(user.id, author.id)
+            invalidate_relations(request, 'following')
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class SubscriptionsViewSet(viewsets.GenericViewSet, ListModelMixin):
+class SubscriptionsViewSet(MetricsMixin, ReplicaReadMixin,
+                           PaginationModeMixin, viewsets.GenericViewSet,
+                           ListModelMixin):
     serializer_class = SubscribeSerializer
     permission_classes = (IsAuthenticated,)
     pagination_class = PageNumberPagination
+    cursor_pagination_class = SubscriptionCursorPagination
 
     def get_queryset(self):
-        return Subscribe.objects.filter(user=self.request.user)
+        return (
+            Subscribe.objects
+            .filter(user=self.request.user)
+            .select_related('author')
+            .order_by('-id')
+        )
 
 
-class TagsViewSet(viewsets.GenericViewSet, ListModelMixin, RetrieveModelMixin):
+class TagsViewSet(MetricsMixin, ReplicaReadMixin, CachedListMixin,
+                  viewsets.GenericViewSet,
+                  ListModelMixin, RetrieveModelMixin):
     permission_classes = (AllowAny,)
     serializer_class = TagSerializer
     pagination_class = None
     queryset = Tag.objects.all()
+    payload_name = 'tags'
 
 
-class IngredientsViewSet(viewsets.GenericViewSet,
-                         ListModelMixin, RetrieveModelMixin):
+class IngredientsViewSet(MetricsMixin, ReplicaReadMixin, CachedListMixin,
+                         viewsets.GenericViewSet, ListModelMixin,
+                         RetrieveModelMixin):
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     permission_classes = (AllowAny,)
@@ -72,15 +118,45 @@ class IngredientsViewSet(viewsets.GenericViewSet,
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
     search_fields = (r'^name',)
+    payload_name = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+
+        if not name:
+            return super().list(request, *args, **kwargs)
+
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            try:
+                limit = serializers.IntegerField(
+                    min_value=1
+                ).run_validation(limit)
+            except serializers.ValidationError as error:
+                raise serializers.ValidationError({'limit': error.detail})
 
+        return Response(ingredient_index.search(name, limit))
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+
+class RecipeViewSet(MetricsMixin, ReplicaReadMixin, FastReadMixin,
+                    PaginationModeMixin, viewsets.ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     pagination_class = PageNumberPagination
+    cursor_pagination_class = RecipeCursorPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    fast_reader = recipe_reader
+
+    def get_queryset(self):
+        queryset = Recipe.objects.all()
+
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_user_flags(self.request.user)
+            if not self.use_fast_read():
+                queryset = queryset.with_related()
+
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -88,77 +164,172 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return RecipeWriteSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe_created(serializer.save(author=self.request.user))
 
-    @action(detail=True, methods=('POST', 'DELETE'),
-            permission_classes=[IsAuthenticated])
-    def favorite(self, request, pk):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        favorite = Favorite.objects.filter(user=request.user,
-                                           recipe=recipe.id).exists()
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        delete_recipe(instance)
+
+    def change_collection(self, collection, errors):
+        try:
+            recipe_id = int(self.kwargs['pk'])
+        except ValueError:
+            raise Http404
 
         if self.request.method == 'POST':
-            if favorite:
-                return Response({'errors': 'Рецепт уже есть в избранном'},
-                                status=status.HTTP_400_BAD_REQUEST,)
-            Favorite.objects.get_or_create(user=request.user, recipe=recipe)
-            data = FollowOrShoppingCartSerializer(recipe).data
+            statuses, recipes = collection.add(self.request, [recipe_id])
+            result = statuses[recipe_id]
+            if result == services.NOT_FOUND:
+                raise Http404
+            if result == services.EXISTS:
+                return Response({'errors': errors[result]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            data = FollowOrShoppingCartSerializer(recipes[recipe_id]).data
             return Response(data, status=status.HTTP_201_CREATED)
 
-        elif self.request.method == 'DELETE':
-            if favorite:
-                follow = get_object_or_404(Favorite,
-                                           user=request.user,
-                                           recipe=recipe)
-                follow.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            return Response({'errors': 'Такого рецепта нет в избранном'},
+        result = collection.remove(self.request, [recipe_id])[recipe_id]
+        if result == services.NOT_FOUND:
+            raise Http404
+        if result == services.MISSING:
+            return Response({'errors': errors[result]},
                             status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def change_collection_batch(self, collection):
+        serializer = RecipeBatchSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+
+        if self.request.method == 'POST':
+            statuses, _ = collection.add(self.request, recipe_ids)
+        else:
+            statuses = collection.remove(self.request, recipe_ids)
+        return Response({'results': [
+            {'id': recipe_id, 'status': result}
+            for recipe_id, result in statuses.items()
+        ]})
+
+    @action(detail=True, methods=('POST', 'DELETE'),
+            permission_classes=[IsAuthenticated])
+    def favorite(self, request, pk):
+        return self.change_collection(services.favorites, {
+            services.EXISTS: 'Рецепт уже есть в избранном',
+            services.MISSING: 'Такого рецепта нет в избранном',
+        })
+
+    @action(detail=False, methods=('POST', 'DELETE'), url_path='favorite',
+            permission_classes=[IsAuthenticated])
+    def favorite_batch(self, request):
+        return self.change_collection_batch(services.favorites)
 
     @action(detail=True, methods=('POST', 'DELETE'),
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        shopping_cart = ShoppingCart.objects.filter(user=request.user,
-                                                    recipe=recipe.id).exists()
+        return self.change_collection(services.shopping_cart, {
+            services.EXISTS: 'Рецепт уже есть в списке покупок',
+            services.MISSING: 'Такого рецепта нет в списке покупок',
+        })
 
-        if self.request.method == 'POST':
-            if shopping_cart:
-                return Response({'errors': 'Рецепт уже есть в списке покупок'},
-                                status=status.HTTP_400_BAD_REQUEST,)
-            ShoppingCart.objects.get_or_create(user=request.user,
-                                               recipe=recipe)
-            data = FollowOrShoppingCartSerializer(recipe).data
-            return Response(data, status=status.HTTP_201_CREATED)
+    @action(detail=False, methods=('POST', 'DELETE'),
+            url_path='shopping_cart', permission_classes=[IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        return self.change_collection_batch(services.shopping_cart)
 
-        elif self.request.method == 'DELETE':
-            if shopping_cart:
-                shopping_cart = get_object_or_404(ShoppingCart,
-                                                  user=request.user,
-                                                  recipe=recipe)
-                shopping_cart.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            return Response({'errors': 'Такого рецепта нет в списке покупок'},
-                            status=status.HTTP_400_BAD_REQUEST)
+    @action(detail=True, methods=('GET', ))
+    def similar(self, request, pk):
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise Http404
+        recipes = [
+            entry.similar for entry in
+            SimilarRecipe.objects.filter(recipe=recipe_id)
+            .select_related('similar')
+        ]
+        if not recipes:
+            get_object_or_404(Recipe, pk=recipe_id)
+        serializer = FollowOrShoppingCartSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=('GET', ))
+    def pantry(self, request):
+        serializer = PantrySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        found = pantry_index.search(**serializer.validated_data)
+
+        recipes = Recipe.objects.only(*services.RECIPE_FIELDS).in_bulk(
+            [recipe_id for recipe_id, *_ in found]
+        )
+        results = []
+        for recipe_id, matched, total in found:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched = matched
+            recipe.missing = total - matched
+            recipe.coverage = round(matched / total, 3)
+            results.append(recipe)
+
+        serializer = PantryRecipeSerializer(
+            results, many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
 
     @action(detail=False, methods=('GET', ),
             permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        paginator = FeedPagination()
+        recipe_ids = paginator.paginate_ids(
+            request,
+            lambda before, limit: feed_ids(request.user.id, before, limit)
+        )
+        recipes = (
+            Recipe.objects
+            .filter(id__in=recipe_ids)
+            .with_user_flags(request.user)
+            .with_related()
+        )
+        serializer = RecipeReadSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=('GET', ),
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, PDFRenderer])
     def download_shopping_cart(self, request):
-        if not request.user.shoppingcart.exists():
+        export = ShoppingListExport(request.user,
+                                    request.accepted_renderer.format)
+        content = export.cached()
+
+        if etag_matches(request, export.etag):
+            response = HttpResponseNotModified()
+        elif content is not None:
+            response = HttpResponse(content, content_type=export.content_type)
+            response['Content-Length'] = len(content)
+        elif export.is_empty:
             return Response('В списке покупок нет рецептов',
                             status=status.HTTP_400_BAD_REQUEST)
-        ingredients = (
-            IngredientRecipe.objects
-            .filter(recipe__shoppingcart__user=request.user)
-            .values('ingredient')
-            .annotate(total_amount=Sum('amount'))
-            .values_list('ingredient__name', 'total_amount',
-                         'ingredient__measurement_unit')
+        else:
+            response = StreamingHttpResponse(export.stream(),
+                                             content_type=export.content_type)
+
+        response['ETag'] = export.etag
+        response['Content-Disposition'] = (
+            f'attachment; filename="{export.filename}"'
         )
+        return response
+
+
+class MetricsView(APIView):
+    """Метрики запросов в текстовом формате Prometheus."""
+
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (PlainTextRenderer,)
 
-        shopping_cart = 'Список покупок: \n'
-        for ingredient in ingredients:
-            shopping_cart += '* {} - {} {}. \n'.format(*ingredient)
-        return FileResponse(shopping_cart, content_type='text/plain',
-                            as_attachment=True, status=status.HTTP_200_OK)
+    def get(self, request):
+        return Response(metrics.render())
@@ -0,0 +1,14 @@
+import os
+from logging.handlers import RotatingFileHandler
+
+
+class DirectoryRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler, который создаёт каталог лога при первой записи,
+    а не при импорте настроек: команды и тесты на read-only образе не
+    пишут в файловую систему, пока в лог ничего не попало.
+    """
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
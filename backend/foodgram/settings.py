@@ -38,6 +38,8 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'api.sqlprofiler.SQLProfilerMiddleware',
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +82,47 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: DB_REPLICA_HOSTS=host1,host2:5433
+DATABASE_REPLICAS = []
+
+for number, address in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(',')),
+        start=1):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['recipe.replicas.ReplicaRouter']
+
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=10))
+
+# LocMemCache по умолчанию — только для разработки в одном процессе: версии
+# данных и кеши не видны другим воркерам. В продакшене нужен общий кеш:
+# CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache,
+# CACHE_LOCATION=cache:11211 (см. infra/docker-compose.yml).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+# Время жизни версий данных, если кеш в памяти процесса: столько секунд
+# воркер может не видеть изменений, сделанных другими процессами.
+VERSION_LOCAL_TIMEOUT = int(os.getenv('VERSION_LOCAL_TIMEOUT', default=60))
+
+RELATIONS_CACHE_TIMEOUT = int(os.getenv('RELATIONS_CACHE_TIMEOUT',
+                                        default=0))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -101,7 +144,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS':
@@ -113,6 +156,67 @@ REST_FRAMEWORK = {
     ),
 }
 
+FAST_READ_PATH = bool(
+    os.getenv('FAST_READ_PATH', default='False').lower() in 'true'
+)
+
+if FAST_READ_PATH:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    )
+
+ASYNC_READ_PATH = bool(
+    os.getenv('ASYNC_READ_PATH', default='False').lower() in 'true'
+)
+
+ASYNC_READ_THREADS = int(os.getenv('ASYNC_READ_THREADS', default=8))
+
+RECIPES_LIMIT_MAX = 30
+
+RECIPES_BATCH_MAX = 100
+
+# Авторы с таким числом подписчиков не рассылают рецепты в ленты:
+# лента дочитывает их рецепты при запросе
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS',
+                                          default=1000))
+
+SIMILAR_RECIPES_COUNT = 10
+
+SIMILAR_RECIPES_TAG_WEIGHT = 0.2
+
+# Ингредиенты из большего числа рецептов не используются для поиска
+# кандидатов в похожие
+SIMILAR_RECIPES_MAX_POSTING = 1000
+
+SIMILAR_RECIPES_CANDIDATES = 200
+
+PANTRY_INGREDIENTS_MAX = 50
+
+# Журнал изменений состава рецептов для индексов поиска по продуктам
+# в воркерах: сколько записей хранить и сколько последних перечитывать
+PANTRY_JOURNAL_SIZE = 10000
+
+PANTRY_JOURNAL_OVERLAP = 1000
+
+TOKEN_CACHE_SIZE = 10000
+
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', default=60))
+
+# Алиас общего кеша Django для снимков токенов, пусто — только LRU процесса
+TOKEN_CACHE_ALIAS = os.getenv('TOKEN_CACHE_ALIAS', default='')
+
+APPROXIMATE_COUNT_TIMEOUT = 60
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+
+SHOPPING_LIST_CACHE_MAX_SIZE = 1024 * 1024
+
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 LANGUAGE_CODE = 'ru-ru'
 
 TIME_ZONE = 'UTC'
@@ -129,6 +233,35 @@ MEDIA_URL = '/back-media/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'back-static')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'back-media')
 
+IMAGE_VARIANTS = {
+    'card': (480, 480),
+    'detail': (960, 960),
+    'retina': (1920, 1920),
+}
+
+IMAGE_VARIANT_QUALITY = 80
+
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS',
+                                         default=2))
+
+METRICS_DIR = os.getenv('METRICS_DIR', default='')
+
+METRICS_FLUSH_INTERVAL = 5
+
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+SQL_PROFILER_SAMPLE_RATE = float(os.getenv('SQL_PROFILER_SAMPLE_RATE',
+                                           default=0.01))
+
+SQL_PROFILER_SLOW_MS = int(os.getenv('SQL_PROFILER_SLOW_MS', default=100))
+
+SQL_PROFILER_REPEAT_THRESHOLD = 5
+
+SQL_PROFILER_MAX_EXPLAINS = 3
+
+SQL_PROFILER_LOG = os.getenv('SQL_PROFILER_LOG',
+                             default=os.path.join(BASE_DIR, 'logs', 'sql.log'))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -153,6 +286,20 @@ LOGGING = {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        'sql_profiler': {
+            'class': 'foodgram.log_handlers.DirectoryRotatingFileHandler',
+            'filename': SQL_PROFILER_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'foodgram.sql': {
+            'handlers': ['sql_profiler'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
     'root': {
         'handlers': ['console'],
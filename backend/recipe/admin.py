@@ -1,7 +1,20 @@
 from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db import transaction
 
+from recipe.counters import reconcile
+from recipe.lifecycle import delete_recipe, recipe_created
 from recipe.models import (Ingredient, Recipe, Tag, Favorite,
                            ShoppingCart, Subscribe)
+from recipe.pantry import record_changes
+from recipe.search import update_search_vectors
+from recipe.shopping_list import (rebuild_shopping_list, recipe_amounts,
+                                  update_recipe_in_shopping_lists)
+from recipe.similar import update_similar
+from recipe.timeline import rebuild_timeline
+from recipe.versions import bump_version
+
+User = get_user_model()
 
 
 class IngredientsField(admin.TabularInline):
@@ -20,10 +33,83 @@ class RecipeAdmin(admin.ModelAdmin):
                     'cooking_time', 'get_ingredient')
     list_filter = ('name', 'author', )
     list_editable = ('text', )
+    readonly_fields = ('favorites_count', 'image_variants', )
     inlines = [TagsFields, IngredientsField]
     list_max_show_all = 15
     empty_value_display = '-пусто-'
 
+    def get_readonly_fields(self, request, obj=None):
+        # Счётчики и ленты не пересчитываются при смене автора, в API её
+        # тоже нет.
+        if obj is not None:
+            return self.readonly_fields + ('author', )
+        return self.readonly_fields
+
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        old_amounts = recipe_amounts(recipe.id) if change else {}
+        super().save_related(request, form, formsets, change)
+        # Состав сохраняется инлайном, сигналов IngredientRecipe нет:
+        # производные данные пересчитываются так же, как в API.
+        update_recipe_in_shopping_lists(recipe.id, old_amounts,
+                                        recipe_amounts(recipe.id))
+        record_changes([recipe.id])
+        update_search_vectors([recipe.id])
+        update_similar(recipe.id)
+        bump_version('recipes')
+        if not change:
+            recipe_created(recipe)
+
+    def delete_model(self, request, obj):
+        delete_recipe(obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for recipe in queryset:
+            delete_recipe(recipe)
+
+
+class RelationAdmin(admin.ModelAdmin):
+    """
+    Подписки, избранное и список покупок. После изменения в админке
+    производные данные пересчитываются для затронутых пользователей и
+    объектов, как в командах rebuild_* и reconcile_counters.
+    """
+
+    target = None
+    relation = None
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.repair(
+            {obj.user_id, form.initial.get('user')},
+            {getattr(obj, f'{self.target}_id'), form.initial.get(self.target)}
+        )
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.repair({obj.user_id}, {getattr(obj, f'{self.target}_id')})
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        pairs = list(queryset.values_list('user', self.target))
+        super().delete_queryset(request, queryset)
+        self.repair({user for user, _ in pairs},
+                    {target for _, target in pairs})
+
+    def repair(self, user_ids, target_ids):
+        user_ids = user_ids - {None}
+        target_ids = target_ids - {None}
+        self.rebuild(user_ids, target_ids)
+        for user_id in user_ids:
+            transaction.on_commit(
+                lambda user_id=user_id: bump_version(
+                    'relations', user_id, self.relation)
+            )
+
+    def rebuild(self, user_ids, target_ids):
+        pass
+
 
 @admin.register(Ingredient)
 class IngredientsAdmin(admin.ModelAdmin):
@@ -44,25 +130,45 @@ class TagsAdmin(admin.ModelAdmin):
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(RelationAdmin):
     list_display = ('user', 'recipe',)
     list_editable = ('user',)
     list_display_links = None
     list_max_show_all = 15
     empty_value_display = '-пусто-'
+    target = 'recipe'
+    relation = 'favorites'
+
+    def rebuild(self, user_ids, target_ids):
+        reconcile(Recipe, 'favorites_count', Favorite, 'recipe', target_ids)
 
 
 @admin.register(Subscribe)
-class SubscribeAdmin(admin.ModelAdmin):
+class SubscribeAdmin(RelationAdmin):
     list_display = ('user', 'author',)
     list_editable = ('user',)
     list_display_links = None
     list_max_show_all = 15
     empty_value_display = '-пусто-'
+    target = 'author'
+    relation = 'following'
+
+    def rebuild(self, user_ids, target_ids):
+        reconcile(User, 'followers_count', Subscribe, 'author', target_ids)
+        # Автор мог перейти порог FEED_FANOUT_MAX_FOLLOWERS: ленты всех
+        # его подписчиков пересобираются.
+        followers = Subscribe.objects.filter(
+            author__in=target_ids).values_list('user', flat=True)
+        rebuild_timeline(user_ids | set(followers))
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(RelationAdmin):
     list_display = ('user', 'recipe',)
     list_max_show_all = 15
     empty_value_display = '-пусто-'
+    target = 'recipe'
+    relation = 'shopping_cart'
+
+    def rebuild(self, user_ids, target_ids):
+        rebuild_shopping_list(list(user_ids))
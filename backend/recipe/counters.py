@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from recipe.models import Favorite, Recipe, Subscribe
+
+User = get_user_model()
+
+
+def counters():
+    return (
+        (Recipe, 'favorites_count', Favorite, 'recipe'),
+        (User, 'recipes_count', Recipe, 'author'),
+        (User, 'followers_count', Subscribe, 'author'),
+    )
+
+
+def change_counter(model, pk, field, delta):
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    if pks:
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+
+
+def actual_count(related_model, foreign_key):
+    return Coalesce(Subquery(
+        related_model.objects
+        .filter(**{foreign_key: OuterRef('pk')})
+        .order_by()
+        .values(foreign_key)
+        .annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+def drifted(model, field, related_model, foreign_key):
+    return (
+        model.objects
+        .annotate(actual=actual_count(related_model, foreign_key))
+        .exclude(**{field: F('actual')})
+        .values_list('pk', flat=True)
+    )
+
+
+def reconcile(model, field, related_model, foreign_key, pks=None):
+    queryset = model.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    return queryset.update(
+        **{field: actual_count(related_model, foreign_key)}
+    )
@@ -0,0 +1,92 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from recipe.imaging import render_variants
+from recipe.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipe_images/variants'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+    return _executor
+
+
+def variants_dir(recipe_id, image_name):
+    stem = PurePosixPath(image_name).stem
+    return f'{VARIANTS_DIR}/{recipe_id}/{stem}'
+
+
+def process_image(recipe_id, image_name):
+    target = variants_dir(recipe_id, image_name)
+    arguments = (
+        default_storage.path(image_name),
+        default_storage.path(target),
+        settings.IMAGE_VARIANTS,
+        settings.IMAGE_VARIANT_QUALITY,
+    )
+
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        try:
+            result = render_variants(*arguments)
+        except Exception:
+            logger.exception('Не удалось обработать изображение %s',
+                             image_name)
+        else:
+            store_variants(recipe_id, image_name, target, result)
+        return
+
+    future = get_executor().submit(render_variants, *arguments)
+    future.add_done_callback(partial(
+        variants_done, recipe_id, image_name, target, threading.get_ident()
+    ))
+
+
+def variants_done(recipe_id, image_name, target, submitter, future):
+    try:
+        error = future.exception()
+        if error is not None:
+            logger.error('Не удалось обработать изображение %s: %s',
+                         image_name, error)
+            return
+        store_variants(recipe_id, image_name, target, future.result())
+    finally:
+        if threading.get_ident() != submitter:
+            connection.close()
+
+
+def store_variants(recipe_id, image_name, target, result):
+    variants = {
+        name: {extension: f'{target}/{filename}'
+               for extension, filename in formats.items()}
+        for name, formats in result.items()
+    }
+    Recipe.objects.filter(id=recipe_id, image=image_name).update(
+        image_variants=variants
+    )
+
+
+def schedule_image_variants(recipe):
+    """Ставит в очередь обработку изображения после коммита транзакции."""
+    transaction.on_commit(partial(process_image, recipe.id, recipe.image.name))
@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+
+def render_variants(source, target_dir, variants, quality):
+    """
+    Создаёт уменьшенные копии изображения во всех форматах.
+
+    Выполняется в отдельном процессе, поэтому работает только с путями
+    файлов и не обращается к Django. Возвращает пути созданных файлов
+    относительно target_dir: {variant: {format: path}}.
+    """
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    result = {}
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for name, size in variants.items():
+            variant = image.copy()
+            variant.thumbnail(size, Image.LANCZOS)
+            result[name] = {}
+            for extension, image_format in FORMATS.items():
+                filename = f'{name}.{extension}'
+                variant.save(target_dir / filename, image_format,
+                             quality=quality)
+                result[name][extension] = filename
+
+    return result
@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+
+from recipe.counters import change_counter
+from recipe.shopping_list import (apply_shopping_list_delta, cart_users,
+                                  recipe_amounts)
+from recipe.timeline import fan_out
+
+User = get_user_model()
+
+
+def recipe_created(recipe):
+    """Вызывается после сохранения нового рецепта: из API и из админки."""
+    change_counter(User, recipe.author_id, 'recipes_count', 1)
+    fan_out(recipe)
+
+
+def delete_recipe(recipe):
+    """Удаляет рецепт и убирает его состав из списков покупок."""
+    apply_shopping_list_delta(cart_users(recipe.id), {
+        ingredient: -amount
+        for ingredient, amount in recipe_amounts(recipe.id).items()
+    })
+    recipe.delete()
+    change_counter(User, recipe.author_id, 'recipes_count', -1)
@@ -0,0 +1,145 @@
+import json
+from datetime import datetime, timezone
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.benchmarks import ENDPOINTS, Dataset, measure
+from recipe.versions import bump_version
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Замеряет задержку (процентили), число SQL-запросов и размер ответа
+    для публичных эндпоинтов API на тестовом наборе данных и проверяет
+    бюджеты запросов. Набор данных создаётся в транзакции, которая по
+    окончании откатывается (если не указан --keep).
+
+    Для использования воспользуйтесь командой:
+    python manage.py benchmark_api [--users 50] [--recipes 500]
+    [--favorites 20] [--cart 10] [--subscriptions 10] [--ingredients 200]
+    [--repeat 50] [--only recipes,tags] [--output result.json]
+    [--compare previous.json] [--keep]
+    """
+
+    help = 'Бенчмарк эндпоинтов API с бюджетами SQL-запросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Рецептов в избранном у пользователя')
+        parser.add_argument('--cart', type=int, default=10,
+                            help='Рецептов в списке покупок у пользователя')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Подписок у пользователя')
+        parser.add_argument('--ingredients', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Замеров на эндпоинт')
+        parser.add_argument('--only',
+                            help='Имена эндпоинтов через запятую')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+        parser.add_argument('--compare',
+                            help='JSON предыдущего запуска для сравнения')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не откатывать тестовые данные')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно минимум 2 пользователя и 1 рецепт.')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным.')
+
+        endpoints = ENDPOINTS
+        if options['only']:
+            names = set(options['only'].split(','))
+            endpoints = [
+                endpoint for endpoint in ENDPOINTS if endpoint.name in names
+            ]
+            if not endpoints:
+                raise CommandError('Эндпоинты не найдены.')
+
+        dataset = Dataset(
+            users=options['users'], recipes=options['recipes'],
+            favorites=options['favorites'], cart=options['cart'],
+            subscriptions=options['subscriptions'],
+            ingredients=options['ingredients']
+        )
+
+        try:
+            with transaction.atomic():
+                self.stdout.write('Создаём тестовые данные...')
+                dataset.seed()
+                results = [
+                    measure(dataset, endpoint, options['repeat'])
+                    for endpoint in endpoints
+                ]
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            # Версии в кэше могли указывать на откаченные данные.
+            for name in ('recipes', 'ingredients', 'tags'):
+                bump_version(name)
+
+        report = {
+            'started': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'dataset': dataset.size,
+            'repeat': options['repeat'],
+            'endpoints': results,
+        }
+        previous = self.load(options['compare'])
+        self.print_report(results, previous)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты записаны в {options["output"]}.')
+
+        failed = [
+            result for result in results
+            if result['queries'] > result['budget']
+            or result['status'] != 200
+        ]
+        if failed:
+            raise CommandError('Бюджет запросов превышен или ответ с ошибкой: '
+                               + ', '.join(r['name'] for r in failed))
+
+        self.stdout.write(self.style.SUCCESS('Все бюджеты соблюдены.'))
+
+    def load(self, path):
+        if not path:
+            return {}
+
+        with open(path, encoding='utf-8') as file:
+            report = json.load(file)
+        return {result['name']: result for result in report['endpoints']}
+
+    def print_report(self, results, previous):
+        self.stdout.write(
+            f'{"эндпоинт":<24}{"код":>5}{"запросы":>9}{"байт":>9}'
+            f'{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}'
+        )
+        for result in results:
+            latency = result['latency_ms']
+            line = (
+                f'{result["name"]:<24}{result["status"]:>5}'
+                f'{result["queries"]:>5}/{result["budget"]:<3}'
+                f'{result["bytes"]:>9}{latency["p50"]:>10.2f}'
+                f'{latency["p95"]:>10.2f}{latency["p99"]:>10.2f}'
+            )
+
+            before = previous.get(result['name'])
+            if before:
+                change = latency['p50'] / before['latency_ms']['p50'] - 1
+                line += (f'  p50 {change:+.0%}, запросы '
+                         f'{result["queries"] - before["queries"]:+d}')
+
+            if (result['queries'] > result['budget']
+                    or result['status'] != 200):
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
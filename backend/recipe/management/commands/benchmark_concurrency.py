@@ -0,0 +1,149 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from rest_framework.authtoken.models import Token
+
+from api.loadtest import AsyncLoad, SyncLoad
+from recipe.models import Ingredient, Recipe
+
+MODES = {'sync': SyncLoad, 'async': AsyncLoad}
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест горячих эндпоинтов чтения (список и страница
+    рецепта, теги, автодополнение ингредиентов) на одном воркере:
+    синхронный WSGI, как gunicorn sync, против ASGI с ASYNC_READ_PATH,
+    как uvicorn. Каждый режим запускается в отдельном процессе на
+    данных из текущей базы.
+
+    Для использования воспользуйтесь командой:
+    python manage.py benchmark_concurrency [--concurrency 1 8 32]
+    [--requests 200] [--user username] [--db-latency 2]
+
+    --db-latency добавляет к каждому SQL-запросу ожидание, как при сетевой
+    задержке до PostgreSQL на другом хосте: на локальной базе воркер
+    занят в основном Python-кодом, и преимущества ASGI не видно.
+    """
+
+    help = 'Сравнение конкурентности синхронного и асинхронного воркера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=[1, 8, 32],
+                            help='Количество одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Количество запросов на каждый уровень')
+        parser.add_argument('--user',
+                            help='Пользователь с токеном, от имени '
+                                 'которого отправлять запросы')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Задержка каждого SQL-запроса, мс')
+        parser.add_argument('--mode', choices=MODES,
+                            help='Замерить один режим в этом процессе')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.measure(options)
+            return
+
+        results = {}
+        for mode in MODES:
+            self.stdout.write(f'Замеряем режим {mode}...')
+            results[mode] = self.run_mode(mode, options)
+        self.print_report(results)
+
+    def run_mode(self, mode, options):
+        command = [
+            sys.executable, sys.argv[0], 'benchmark_concurrency',
+            '--mode', mode, '--requests', str(options['requests']),
+            '--concurrency', *map(str, options['concurrency']),
+            '--db-latency', str(options['db_latency']),
+        ]
+        if options['user']:
+            command += ['--user', options['user']]
+
+        environment = dict(os.environ,
+                           ASYNC_READ_PATH=str(mode == 'async'),
+                           SQL_PROFILER_SAMPLE_RATE='0')
+        completed = subprocess.run(command, env=environment,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL,
+                                   universal_newlines=True)
+        if completed.returncode:
+            raise CommandError(f'Режим {mode} завершился с ошибкой.')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def measure(self, options):
+        mode = options['mode']
+        if settings.ASYNC_READ_PATH != (mode == 'async'):
+            raise CommandError('ASYNC_READ_PATH не соответствует режиму.')
+
+        token = None
+        if options['user']:
+            token = Token.objects.filter(
+                user__username=options['user']
+            ).values_list('key', flat=True).first()
+            if token is None:
+                raise CommandError('У пользователя нет токена.')
+
+        if options['db_latency']:
+            self.add_db_latency(options['db_latency'] / 1000)
+
+        load = MODES[mode](self.urls(), token)
+        # Прогрев: кеши версий, индексы поиска и ингредиентов.
+        load.run(1, len(load.urls))
+        results = [load.run(concurrency, options['requests'])
+                   for concurrency in options['concurrency']]
+        self.stdout.write(json.dumps(results))
+
+    @staticmethod
+    def add_db_latency(seconds):
+        def delay(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            # В начало списка: execute_wrapper() снимает последнюю обёртку,
+            # а подключение создаётся внутри обёрток middleware.
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.insert(0, delay)
+
+        connection_created.connect(install, weak=False)
+
+    @staticmethod
+    def urls():
+        recipe = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True).first()
+        ingredient = Ingredient.objects.values_list('name', flat=True).first()
+        if recipe is None or ingredient is None:
+            raise CommandError('В базе нет рецептов или ингредиентов.')
+
+        return [
+            '/api/recipes/',
+            f'/api/recipes/{recipe}/',
+            '/api/recipes/?page=2',
+            '/api/tags/',
+            '/api/ingredients/?' + urlencode({'name': ingredient[:2]}),
+        ]
+
+    def print_report(self, results):
+        self.stdout.write(
+            f'{"клиентов":>8} {"режим":>6} {"запр/с":>9} {"p50, мс":>9} '
+            f'{"p95, мс":>9} {"p99, мс":>9} {"ошибки":>7}'
+        )
+        for sync, asynchronous in zip(results['sync'], results['async']):
+            for mode, result in (('sync', sync), ('async', asynchronous)):
+                self.stdout.write(
+                    f'{result["concurrency"]:>8} {mode:>6} '
+                    f'{result["rps"]:>9.1f} {result["p50_ms"]:>9.2f} '
+                    f'{result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} '
+                    f'{result["errors"]:>7}'
+                )
@@ -0,0 +1,91 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.fastread import recipe_reader
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import RecipeReadSerializer
+from recipe.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает время сборки JSON списка рецептов через
+    RecipeReadSerializer + JSONRenderer и через быстрый путь
+    (api.fastread + FastJSONRenderer). Данные из базы читаются один раз,
+    измеряется только сериализация и рендеринг.
+
+    Для использования воспользуйтесь командой:
+    python manage.py benchmark_read_path [--limit 50] [--repeat 200]
+    [--user username]
+    """
+
+    help = 'Микробенчмарк быстрого пути чтения рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50,
+                            help='Количество рецептов на странице')
+        parser.add_argument('--repeat', type=int, default=200,
+                            help='Количество повторов')
+        parser.add_argument('--user',
+                            help='Пользователь, от имени которого читать')
+
+    def handle(self, *args, **options):
+        user = AnonymousUser()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError('Пользователь не найден.')
+
+        request = Request(RequestFactory().get('/api/recipes/'))
+        request.user = user
+        queryset = Recipe.objects.with_user_flags(user)
+        limit = options['limit']
+
+        recipes = list(queryset.with_related()[:limit])
+        rows = list(recipe_reader.values(queryset)[:limit])
+        if not rows:
+            raise CommandError('В базе нет рецептов.')
+        context = recipe_reader.load(rows, request)
+
+        def serializer_path():
+            data = RecipeReadSerializer(
+                recipes, many=True, context={'request': request}
+            ).data
+            return JSONRenderer().render(data)
+
+        def fast_path():
+            return FastJSONRenderer().render(
+                recipe_reader.build(rows, context)
+            )
+
+        same = serializer_path() == fast_path()
+        slow = self.measure(serializer_path, options['repeat'])
+        fast = self.measure(fast_path, options['repeat'])
+
+        self.stdout.write(
+            f'Рецептов на странице: {len(rows)}, повторов: '
+            f'{options["repeat"]}, orjson: {"да" if orjson else "нет"}.'
+        )
+        self.stdout.write(f'RecipeReadSerializer: {slow * 1000:.3f} мс')
+        self.stdout.write(f'Быстрый путь: {fast * 1000:.3f} мс')
+        self.stdout.write(f'Ускорение: {slow / fast:.1f}x')
+
+        if same:
+            self.stdout.write(self.style.SUCCESS('Ответы совпадают.'))
+        else:
+            self.stdout.write(self.style.ERROR('Ответы различаются!'))
+
+    @staticmethod
+    def measure(func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat
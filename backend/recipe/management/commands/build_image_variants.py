@@ -0,0 +1,31 @@
+from django.core.management import BaseCommand
+
+from recipe.images import process_image
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Создаёт уменьшенные копии изображений рецептов, у которых их ещё нет.
+
+    Для использования воспользуйтесь командой:
+    python manage.py build_image_variants [--all]
+    """
+
+    help = 'Создаёт уменьшенные копии изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать копии для всех рецептов')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+
+        count = 0
+        for recipe_id, image_name in recipes.values_list('id', 'image'):
+            process_image(recipe_id, image_name)
+            count += 1
+
+        self.stdout.write(f'Отправлено на обработку: {count}.')
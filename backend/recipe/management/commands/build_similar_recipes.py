@@ -0,0 +1,31 @@
+import time
+
+from django.core.management import BaseCommand
+
+from recipe.similar import build_similar
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает таблицу похожих рецептов по составу и тегам. Между
+    запусками таблица обновляется при сохранении рецептов.
+
+    Для использования воспользуйтесь командой:
+    python manage.py build_similar_recipes [--recipes 1 2 3]
+    """
+
+    help = 'Пересчитывает похожие рецепты'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, nargs='+',
+            help='Пересчитать только эти рецепты'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = build_similar(options['recipes'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны для {count} рецептов '
+            f'за {time.perf_counter() - started:.1f} с.'
+        ))
@@ -1,36 +1,306 @@
-import logging
+import csv
+import io
+import json
+import random
+import time
+from itertools import islice
+from pathlib import Path
 
-from csv import DictReader
-from django.core.management import BaseCommand
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from PIL import Image
 
-from recipe.models import Ingredient
+from recipe.counters import reconcile
+from recipe.models import Ingredient, IngredientRecipe, Recipe, Subscribe, Tag
+from recipe.pantry import record_changes
+from recipe.search import update_search_vectors
+from recipe.similar import build_similar
+from recipe.timeline import rebuild_timeline
+from recipe.versions import bump_version
+
+User = get_user_model()
+
+DEFAULT_PATH = Path(settings.BASE_DIR) / 'static' / 'data' / 'ingredients.csv'
+HEADER = ('name', 'measurement_unit')
+JSON_CHUNK_SIZE = 64 * 1024
+JSON_MAX_OBJECT_SIZE = 1024 * 1024
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) < 2 or tuple(value.strip() for value in row[:2]) == HEADER:
+            continue
+        yield row[0].strip(), row[1].strip()
+
+
+def iter_json_array(file):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+
+    for chunk in iter(lambda: file.read(JSON_CHUNK_SIZE), ''):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                # Объект может продолжиться в следующем куске файла,
+                # но не бесконечно: битый объект не копится до конца.
+                if len(buffer) - position > JSON_MAX_OBJECT_SIZE:
+                    raise CommandError(f'Некорректный JSON: {error}')
+                break
+            yield item
+
+    if not started:
+        raise CommandError('Ожидался JSON-массив.')
+    if buffer[position:].strip():
+        try:
+            decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            raise CommandError(f'Некорректный JSON: {error}')
+    raise CommandError('JSON-массив не закрыт: файл обрезан.')
+
+
+def read_json(file):
+    for item in iter_json_array(file):
+        try:
+            yield item['name'].strip(), item['measurement_unit'].strip()
+        except (KeyError, TypeError, AttributeError):
+            raise CommandError(
+                f'Ожидались строки name и measurement_unit: {item!r}'
+            )
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
 
 
 class Command(BaseCommand):
     """
-    Скрипт загружает тестовые данные из csv файлов в БД.
+    Скрипт загружает ингредиенты из csv или json файлов в БД.
+
+    Загрузку можно запускать повторно: уже существующие ингредиенты
+    пропускаются. Дополнительно можно создать теги и тестовые рецепты,
+    после них пересчитываются производные данные рецептов.
 
     Для использования воспользуйтесь командой:
-    python manage.py load_csv
+    python manage.py load_csv [path ...] [--tags] [--recipes N]
     """
 
+    help = 'Загружает ингредиенты (а также теги и тестовые рецепты) в БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', type=Path,
+                            help='Файлы ingredients.csv или ingredients.json')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--copy', action='store_true',
+                            help='Загрузка через COPY (только PostgreSQL)')
+        parser.add_argument('--tags', action='store_true',
+                            help='Создать стандартные теги')
+        parser.add_argument('--recipes', type=int, default=0,
+                            help='Создать указанное число тестовых рецептов')
+
     def handle(self, *args, **options):
+        paths = options['paths'] or [DEFAULT_PATH]
+        batch_size = options['batch_size']
+
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy поддерживается только PostgreSQL.')
+
+        for path in paths:
+            self.load_ingredients(path, batch_size, options['copy'])
+        # bulk_create и COPY не вызывают сигналы моделей: версии для
+        # кешей ответов и индексов сбрасываются явно.
+        bump_version('ingredients')
+
+        if options['tags']:
+            self.load_tags()
+
+        if options['recipes']:
+            self.load_recipes(options['recipes'], batch_size)
+
+        self.stdout.write(
+            self.style.SUCCESS('Все данные успешно импортированы!')
+        )
+
+    def load_ingredients(self, path, batch_size, use_copy):
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(f'Неподдерживаемый формат файла: {path}')
 
         try:
-            logging.debug('Данные импортируются...')
+            file = open(path, encoding='utf8')
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть {path}: {error}')
+
+        self.stdout.write(f'Импорт {path}...')
+        before = Ingredient.objects.count()
+        started = time.monotonic()
+        processed = 0
+
+        with file:
+            rows = reader(file)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                if use_copy:
+                    self.copy_ingredients(batch)
+                else:
+                    Ingredient.objects.bulk_create(
+                        [Ingredient(name=name, measurement_unit=unit)
+                         for name, unit in batch],
+                        ignore_conflicts=True
+                    )
+                processed += len(batch)
+                self.report(processed, started)
+
+        inserted = Ingredient.objects.count() - before
+        self.stdout.write(
+            f'{path.name}: обработано {processed}, добавлено {inserted}, '
+            f'пропущено {processed - inserted}.'
+        )
+
+    def copy_ingredients(self, batch):
+        table = Ingredient._meta.db_table
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
 
-            for row in DictReader(open('static/data/ingredients.csv',
-                                       encoding='utf8')):
-                ingredients = Ingredient(
-                    name=row['name'],
-                    measurement_unit=row['measurement_unit']
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_staging '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_staging (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT DISTINCT name, measurement_unit '
+                f'FROM ingredient_staging '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+
+    def report(self, processed, started):
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(f'  {processed} строк, {rate:.0f} строк/с')
+
+    def load_tags(self):
+        Tag.objects.bulk_create(
+            [Tag(name=name, color=color, slug=slug)
+             for name, color, slug in DEFAULT_TAGS],
+            ignore_conflicts=True
+        )
+        bump_version('tags')
+        self.stdout.write('Теги импортированы.')
+
+    def load_recipes(self, count, batch_size):
+        authors = list(User.objects.values_list('id', flat=True))
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        tags = list(Tag.objects.values_list('id', flat=True))
+
+        if not authors or not ingredients:
+            raise CommandError(
+                'Для тестовых рецептов нужны пользователи и ингредиенты.'
+            )
+
+        image = self.placeholder_image()
+        started = time.monotonic()
+        created = 0
+        recipe_authors = set()
+
+        while created < count:
+            size = min(batch_size, count - created)
+            with transaction.atomic():
+                recipes = self.create_recipes([
+                    Recipe(name=f'Рецепт {created + number + 1}',
+                           author_id=random.choice(authors),
+                           image=image,
+                           text='Тестовый рецепт.',
+                           cooking_time=random.randint(5, 120))
+                    for number in range(size)
+                ])
+                recipe_authors.update(recipe.author_id for recipe in recipes)
+                IngredientRecipe.objects.bulk_create(
+                    IngredientRecipe(recipe=recipe, ingredient_id=ingredient,
+                                     amount=random.randint(1, 500))
+                    for recipe in recipes
+                    for ingredient in random.sample(
+                        ingredients, min(len(ingredients),
+                                         random.randint(2, 10)))
                 )
-                ingredients.save()
+                recipe_ids = [recipe.id for recipe in recipes]
+                update_search_vectors(recipe_ids)
+                record_changes(recipe_ids)
+                if tags:
+                    Recipe.tags.through.objects.bulk_create(
+                        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag)
+                        for recipe in recipes
+                        for tag in random.sample(
+                            tags, random.randint(1, len(tags)))
+                    )
+            created += size
+            self.report(created, started)
+
+        reconcile(User, 'recipes_count', Recipe, 'author', authors)
+        self.update_derived(recipe_authors)
+        bump_version('recipes')
+        self.stdout.write(f'Создано тестовых рецептов: {created}.')
+
+    def update_derived(self, authors):
+        """
+        bulk_create не вызывает сигналы и хуки сериализатора: ленты
+        подписчиков и похожие рецепты пересчитываются здесь.
+        """
+        started = time.monotonic()
+        followers = Subscribe.objects.filter(
+            author__in=authors
+        ).values_list('user', flat=True).distinct()
+        rebuild_timeline(followers)
+        build_similar()
+        self.stdout.write(
+            f'Ленты подписок и похожие рецепты обновлены '
+            f'за {time.monotonic() - started:.1f} с.'
+        )
 
-            logging.debug('Данные из ingredients.csv импортированы.')
+    def create_recipes(self, recipes):
+        if connection.features.can_return_rows_from_bulk_insert:
+            return Recipe.objects.bulk_create(recipes)
 
-            logging.debug('Все данные успешно импортированы!')
+        for recipe in recipes:
+            recipe.save()
+        return recipes
 
-        except Exception as error:
-            logging.error(f'Произошла ошибка {error}.\n' 
-                          'Данные не импортированы!')
+    def placeholder_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (480, 480), '#E26C2D').save(buffer, 'JPEG')
+        return default_storage.save('recipe_images/placeholder.jpg',
+                                    ContentFile(buffer.getvalue()))
@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+
+from recipe.search import update_search_vectors, uses_postgres_search
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает поисковые векторы всех рецептов (только PostgreSQL).
+
+    Для использования воспользуйтесь командой:
+    python manage.py rebuild_search_index
+    """
+
+    help = 'Пересчитывает поисковые векторы рецептов'
+
+    def handle(self, *args, **options):
+        if not uses_postgres_search():
+            self.stdout.write(
+                'Полнотекстовый индекс используется только с PostgreSQL, '
+                'на других СУБД поиск строит индекс в памяти.'
+            )
+            return
+
+        update_search_vectors()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс обновлён.'))
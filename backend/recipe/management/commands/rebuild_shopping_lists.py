@@ -0,0 +1,56 @@
+from django.core.management import BaseCommand
+
+from recipe.models import ShoppingCart, ShoppingListItem
+from recipe.shopping_list import aggregated_amounts, rebuild_shopping_list
+
+
+class Command(BaseCommand):
+    """
+    Сверяет агрегированные списки покупок с корзинами пользователей
+    и пересобирает их.
+
+    Для использования воспользуйтесь командой:
+    python manage.py rebuild_shopping_lists [--check]
+    """
+
+    help = 'Пересобирает агрегированные списки покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только показать расхождения, не исправляя их'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = set(
+            ShoppingCart.objects.values_list('user_id', flat=True)
+        ) | set(
+            ShoppingListItem.objects.values_list('user_id', flat=True)
+        )
+        expected = {
+            (user, ingredient): total
+            for user, ingredient, total in aggregated_amounts(user_ids)
+        }
+        actual = {
+            (user, ingredient): total
+            for user, ingredient, total in ShoppingListItem.objects
+            .values_list('user', 'ingredient', 'total_amount')
+        }
+        drifted = {
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        }
+        drifted_users = {user for user, _ in drifted}
+
+        self.stdout.write(
+            f'Расхождений: {len(drifted)} '
+            f'у пользователей: {len(drifted_users)}.'
+        )
+
+        if options['check'] or not drifted_users:
+            return
+
+        rebuild_shopping_list(drifted_users)
+        self.stdout.write(self.style.SUCCESS(
+            'Списки покупок пересобраны.'
+        ))
@@ -0,0 +1,40 @@
+from django.core.management import BaseCommand
+
+from recipe.models import TimelineEntry
+from recipe.timeline import expected_entries, rebuild_timeline
+
+
+class Command(BaseCommand):
+    """
+    Сверяет ленты подписок с подписками пользователей и пересобирает их.
+
+    Для использования воспользуйтесь командой:
+    python manage.py rebuild_timelines [--check]
+    """
+
+    help = 'Пересобирает ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только показать расхождения, не исправляя их'
+        )
+
+    def handle(self, *args, **options):
+        expected = expected_entries()
+        actual = set(
+            TimelineEntry.objects.values_list('user', 'recipe', 'author')
+        )
+        drifted = expected ^ actual
+        drifted_users = {user for user, *_ in drifted}
+
+        self.stdout.write(
+            f'Расхождений: {len(drifted)} '
+            f'у пользователей: {len(drifted_users)}.'
+        )
+
+        if options['check'] or not drifted_users:
+            return
+
+        rebuild_timeline(drifted_users)
+        self.stdout.write(self.style.SUCCESS('Ленты подписок пересобраны.'))
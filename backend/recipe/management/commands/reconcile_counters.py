@@ -0,0 +1,31 @@
+from django.core.management import BaseCommand
+
+from recipe.counters import counters, drifted, reconcile
+
+
+class Command(BaseCommand):
+    """
+    Сверяет счётчики избранного, рецептов и подписчиков с данными
+    и исправляет расхождения.
+
+    Для использования воспользуйтесь командой:
+    python manage.py reconcile_counters [--check]
+    """
+
+    help = 'Сверяет и исправляет денормализованные счётчики'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только показать расхождения, не исправляя их'
+        )
+
+    def handle(self, *args, **options):
+        for model, field, related_model, foreign_key in counters():
+            pks = list(drifted(model, field, related_model, foreign_key))
+            label = f'{model._meta.label}.{field}'
+            self.stdout.write(f'{label}: расхождений {len(pks)}.')
+
+            if pks and not options['check']:
+                reconcile(model, field, related_model, foreign_key, pks)
+                self.stdout.write(self.style.SUCCESS(f'{label}: исправлено.'))
@@ -0,0 +1,53 @@
+# Generated by Django 3.2 on 2023-05-14 12:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def fill_shopping_lists(apps, schema_editor):
+    IngredientRecipe = apps.get_model('recipe', 'IngredientRecipe')
+    ShoppingListItem = apps.get_model('recipe', 'ShoppingListItem')
+    amounts = (
+        IngredientRecipe.objects
+        .filter(recipe__shoppingcart__isnull=False)
+        .values('recipe__shoppingcart__user', 'ingredient')
+        .annotate(total=Sum('amount'))
+        .order_by()
+        .values_list('recipe__shoppingcart__user', 'ingredient', 'total')
+    )
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=user, ingredient_id=ingredient,
+                         total_amount=total)
+        for user, ingredient, total in amounts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipe', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to='recipe.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Позиция списка покупок',
+                'verbose_name_plural': 'Позиции списка покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_user_and_ingredient'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
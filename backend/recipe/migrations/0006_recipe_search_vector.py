@@ -0,0 +1,48 @@
+# Generated by Django 3.2 on 2023-06-04 11:20
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+FILL_SEARCH_VECTOR_SQL = (
+    "UPDATE recipe_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', coalesce(recipe_recipe.name, '')), 'A') "
+    "|| setweight(to_tsvector('russian', coalesce(("
+    "SELECT string_agg(ingredient.name, ' ') "
+    "FROM recipe_ingredientrecipe AS ingredient_recipe "
+    "JOIN recipe_ingredient AS ingredient "
+    "ON ingredient.id = ingredient_recipe.ingredient_id "
+    "WHERE ingredient_recipe.recipe_id = recipe_recipe.id), '')), 'B') "
+    "|| setweight(to_tsvector('russian', coalesce(recipe_recipe.text, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX recipe_search_vector_gin '
+        'ON recipe_recipe USING gin (search_vector)'
+    )
+    schema_editor.execute(FILL_SEARCH_VECTOR_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0005_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
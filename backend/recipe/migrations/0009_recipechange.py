@@ -0,0 +1,24 @@
+# Generated by Django 3.2 on 2026-10-18 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0008_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.BigIntegerField(verbose_name='id рецепта')),
+            ],
+            options={
+                'verbose_name': 'Изменение состава рецепта',
+                'verbose_name_plural': 'Журнал изменений состава рецептов',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2 on 2026-10-18 21:02
+
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def fill_timeline(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Subscribe = apps.get_model('recipe', 'Subscribe')
+    TimelineEntry = apps.get_model('recipe', 'TimelineEntry')
+
+    authors = {}
+    subscriptions = Subscribe.objects.exclude(
+        author__followers_count__gte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('user', 'author')
+    for user, author in subscriptions.iterator():
+        authors.setdefault(author, []).append(user)
+
+    recipes = Recipe.objects.filter(author__in=authors).order_by().values_list(
+        'id', 'author')
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user, recipe_id=recipe, author_id=author)
+         for recipe, author in recipes.iterator()
+         for user in authors[author]),
+        batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0009_recipechange'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_timeline, migrations.RunPython.noop),
+    ]
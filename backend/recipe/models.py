@@ -1,4 +1,6 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Exists, OuterRef, Prefetch
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 
@@ -43,6 +45,55 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient_recipe',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+        )
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_author_subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def top_per_author(self, author_ids, limit=None):
+        author_ids = list(author_ids)
+        if not author_ids:
+            return self.none()
+
+        table = self.model._meta.db_table
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        params = author_ids
+        row_filter = ''
+        if limit is not None:
+            row_filter = 'WHERE row_number <= %s'
+            params = author_ids + [limit]
+
+        return self.raw(
+            f'SELECT id, name, image, image_variants, cooking_time, '
+            f'author_id FROM ('
+            f'SELECT id, name, image, image_variants, cooking_time, '
+            f'author_id, '
+            f'ROW_NUMBER() OVER (PARTITION BY author_id ORDER BY id DESC) '
+            f'AS row_number FROM {table} '
+            f'WHERE author_id IN ({placeholders})) AS ranked '
+            f'{row_filter} ORDER BY author_id, row_number',
+            params
+        )
+
+
 class Recipe(models.Model):
     name = models.CharField(max_length=200, verbose_name='Название рецепта')
     author = models.ForeignKey(User,
@@ -55,6 +106,8 @@ class Recipe(models.Model):
                                          verbose_name='Ингредиенты')
     image = models.FileField(upload_to='recipe_images/',
                              verbose_name='Изображение')
+    image_variants = models.JSONField(default=dict, blank=True,
+                                      verbose_name='Уменьшенные копии')
     text = models.TextField(verbose_name='Описание рецепта')
     tags = models.ManyToManyField(Tag, related_name='recipes',
                                   verbose_name='Теги')
@@ -64,11 +117,19 @@ class Recipe(models.Model):
             limit_value=1,
             message='Время приготовления не может быть меньше 1')]
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное', default=0, db_index=True
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-id',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [models.Index(fields=('author', '-id'),
+                                name='recipe_author_id_desc')]
 
     def get_ingredient(self):
         return "\n".join([f_name.name for f_name in self.ingredients.all()])
@@ -171,3 +232,97 @@ class IngredientRecipe(models.Model):
 
     def __str__(self) -> str:
         return f'{self.recipe_id}'
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='shopping_list',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient,
+                                   on_delete=models.CASCADE,
+                                   related_name='shopping_list',
+                                   verbose_name='Ингредиент')
+    total_amount = models.IntegerField(verbose_name='Общее количество')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_user_and_ingredient'
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user_id}: {self.ingredient_id}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Подписчик')
+    recipe = models.ForeignKey(Recipe,
+                               on_delete=models.CASCADE,
+                               related_name='timeline',
+                               verbose_name='Рецепт')
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+',
+                               verbose_name='Автор рецепта')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_timeline_user_and_recipe'
+            )
+        ]
+        indexes = [models.Index(fields=('user', 'author'),
+                                name='timeline_user_author')]
+
+    def __str__(self) -> str:
+        return f'{self.user_id}: {self.recipe_id}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(Recipe,
+                               on_delete=models.CASCADE,
+                               related_name='similar',
+                               verbose_name='Рецепт')
+    similar = models.ForeignKey(Recipe,
+                                on_delete=models.CASCADE,
+                                related_name='+',
+                                verbose_name='Похожий рецепт')
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        ordering = ('-score', '-similar_id')
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [models.Index(fields=('recipe', '-score', '-similar'),
+                                name='similar_recipe_score')]
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id}: {self.similar_id}'
+
+
+class RecipeChange(models.Model):
+    recipe = models.BigIntegerField(verbose_name='id рецепта')
+
+    class Meta:
+        verbose_name = 'Изменение состава рецепта'
+        verbose_name_plural = 'Журнал изменений состава рецептов'
+
+    def __str__(self) -> str:
+        return f'{self.id}: {self.recipe}'
@@ -0,0 +1,240 @@
+import itertools
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from recipe.models import IngredientRecipe, RecipeChange
+from recipe.replicas import primary
+from recipe.versions import bump_version, get_version
+
+PRUNE_EVERY = 100
+
+_writes = itertools.count(1)
+
+
+def record_changes(recipe_ids):
+    """
+    Записывает в журнал рецепты с изменённым составом и после коммита
+    меняет версию 'pantry'. Индексы других воркеров видят новую версию
+    через общий кеш, а с кешем в памяти процесса — когда их версия
+    истечёт (VERSION_LOCAL_TIMEOUT).
+    """
+    RecipeChange.objects.bulk_create(
+        [RecipeChange(recipe=recipe_id) for recipe_id in set(recipe_ids)]
+    )
+    transaction.on_commit(lambda: bump_version('pantry'))
+
+    if next(_writes) % PRUNE_EVERY == 0:
+        last = RecipeChange.objects.aggregate(last=Max('id'))['last']
+        RecipeChange.objects.filter(
+            id__lte=last - settings.PANTRY_JOURNAL_SIZE
+        ).delete()
+
+
+def load_compositions(recipe_ids=None):
+    rows = IngredientRecipe.objects.order_by()
+    if recipe_ids is not None:
+        rows = rows.filter(recipe__in=recipe_ids)
+
+    compositions = defaultdict(set)
+    for recipe, ingredient in rows.values_list(
+            'recipe', 'ingredient').iterator():
+        compositions[recipe].add(ingredient)
+    return compositions
+
+
+def bitset(positions, length):
+    buffer = bytearray((length + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def positions_desc(bits, limit):
+    result = []
+    while bits and len(result) < limit:
+        position = bits.bit_length() - 1
+        result.append(position)
+        bits ^= 1 << position
+    return result
+
+
+class PantryIndex:
+    """
+    Инвертированный индекс ингредиент → рецепты в памяти процесса для
+    поиска по продуктам.
+
+    Рецепты ингредиента хранятся битовой маской (int) по позициям
+    рецептов, позиции выдаются по возрастанию id. Число совпавших
+    ингредиентов считается побитовым сложением масок, поэтому ранжирование
+    не перебирает рецепты по одному.
+
+    Индекс загружается при первом обращении, а при смене версии
+    'pantry' дочитывает журнал RecipeChange и пересчитывает только
+    изменённые рецепты. В журнал пишут все, кто меняет составы:
+    сериализатор, админка, удаление рецептов и ингредиентов, load_csv.
+    Последние PANTRY_JOURNAL_OVERLAP записей журнала перечитываются:
+    записи транзакций, закоммиченных позже соседних, не теряются. Если
+    воркер отстал больше чем на PANTRY_JOURNAL_SIZE записей, индекс
+    загружается заново.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._position = None
+        self._seen = set()
+        self._postings = {}
+        self._sizes = {}
+        self._recipes = []
+        self._positions = {}
+        self._compositions = {}
+
+    def search(self, ingredients, limit):
+        """
+        Рецепты по доле ингредиентов, которые есть у пользователя:
+        [(recipe_id, есть, всего)]. При равной доле выше рецепты с
+        большим числом совпавших ингредиентов, затем более новые.
+        """
+        version = get_version('pantry')
+
+        with self._lock:
+            if version != self._version:
+                with primary():
+                    self._load(version)
+
+            ingredients = set(ingredients)
+            planes = self._count(ingredients)
+            if not planes:
+                return []
+
+            buckets = sorted(
+                ((matched, total)
+                 for total in self._sizes
+                 for matched in range(1, min(total, len(ingredients)) + 1)),
+                key=lambda bucket: (bucket[0] / bucket[1], bucket[0]),
+                reverse=True
+            )
+            found, equal = [], {}
+            for matched, total in buckets:
+                if matched not in equal:
+                    equal[matched] = self._equal(planes, matched)
+                bits = equal[matched] & self._sizes[total]
+                for position in positions_desc(bits, limit - len(found)):
+                    found.append((self._recipes[position], matched, total))
+                if len(found) >= limit:
+                    break
+            return found
+
+    def _count(self, ingredients):
+        """Двоичные разряды числа совпавших ингредиентов по рецептам."""
+        planes = []
+        for ingredient in ingredients:
+            carry = self._postings.get(ingredient, 0)
+            for level, plane in enumerate(planes):
+                if not carry:
+                    break
+                planes[level], carry = plane ^ carry, plane & carry
+            if carry:
+                planes.append(carry)
+        return planes
+
+    @staticmethod
+    def _equal(planes, matched):
+        if matched >> len(planes):
+            return 0
+        bits = -1
+        for level, plane in enumerate(planes):
+            bits &= plane if matched >> level & 1 else ~plane
+        return bits
+
+    def _load(self, version):
+        if self._position is None:
+            self._build(version)
+            return
+
+        window = list(RecipeChange.objects.filter(
+            id__gt=self._position - settings.PANTRY_JOURNAL_OVERLAP
+        ).values_list('id', 'recipe'))
+        last = max((change for change, _ in window), default=0)
+        if last - settings.PANTRY_JOURNAL_SIZE > self._position:
+            self._build(version)
+            return
+
+        changed = {recipe for change, recipe in window
+                   if change not in self._seen}
+        if changed:
+            self._update(changed)
+        self._seen = {change for change, _ in window}
+        self._position = max(self._position, last)
+        self._version = version
+
+    def _build(self, version):
+        # Журнал читается до составов: запись, закоммиченная между
+        # запросами, просто применится ещё раз при следующей версии.
+        window = list(
+            RecipeChange.objects.order_by('-id')
+            .values_list('id', flat=True)[:settings.PANTRY_JOURNAL_OVERLAP]
+        )
+        compositions = load_compositions()
+
+        recipes = sorted(compositions)
+        postings, sizes = defaultdict(list), defaultdict(list)
+        for position, recipe in enumerate(recipes):
+            for ingredient in compositions[recipe]:
+                postings[ingredient].append(position)
+            sizes[len(compositions[recipe])].append(position)
+
+        self._postings = {ingredient: bitset(items, len(recipes))
+                          for ingredient, items in postings.items()}
+        self._sizes = {size: bitset(items, len(recipes))
+                       for size, items in sizes.items()}
+        self._recipes = recipes
+        self._positions = {recipe: position
+                           for position, recipe in enumerate(recipes)}
+        self._compositions = {recipe: tuple(ingredients)
+                              for recipe, ingredients in compositions.items()}
+        self._seen = set(window)
+        self._position = max(window, default=0)
+        self._version = version
+
+    def _update(self, recipe_ids):
+        compositions = load_compositions(recipe_ids)
+
+        for recipe in sorted(recipe_ids):
+            old = set(self._compositions.pop(recipe, ()))
+            new = compositions.get(recipe, set())
+            if old == new:
+                if new:
+                    self._compositions[recipe] = tuple(new)
+                continue
+
+            if recipe not in self._positions:
+                self._positions[recipe] = len(self._recipes)
+                self._recipes.append(recipe)
+            bit = 1 << self._positions[recipe]
+
+            for ingredient in old - new:
+                self._unset(self._postings, ingredient, bit)
+            for ingredient in new - old:
+                self._postings[ingredient] = (
+                    self._postings.get(ingredient, 0) | bit)
+            if old:
+                self._unset(self._sizes, len(old), bit)
+            if new:
+                self._sizes[len(new)] = self._sizes.get(len(new), 0) | bit
+                self._compositions[recipe] = tuple(new)
+
+    @staticmethod
+    def _unset(bitsets, key, bit):
+        bits = bitsets[key] & ~bit
+        if bits:
+            bitsets[key] = bits
+        else:
+            del bitsets[key]
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,91 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from recipe.versions import is_shared_cache
+
+read_database = ContextVar('read_database', default=None)
+
+
+class ReplicaRouter:
+    """
+    Чтение — из базы, выбранной для текущего запроса (реплика или
+    основная), запись и миграции — только в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = read_database.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def reading_from(alias):
+    token = read_database.set(alias)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+def primary():
+    """Блок читает из основной базы, даже если запрос идёт на реплику."""
+    return reading_from(None)
+
+
+def choose_replica():
+    replicas = settings.DATABASE_REPLICAS
+    return random.choice(replicas) if replicas else None
+
+
+PIN_COOKIE = 'replica_pin'
+PIN_SALT = 'recipe.replicas.pin'
+
+
+def pin_key(user_id):
+    return f'replica:pinned:{user_id}'
+
+
+def pin_to_primary(response, user_id):
+    """
+    После изменений пользователь REPLICA_STICKY_SECONDS секунд читает из
+    основной базы и видит свои изменения независимо от отставания реплик.
+
+    Закрепление хранится в подписанной cookie, которую проверит любой
+    воркер, и, если кеш общий, ещё и в кеше — для клиентов без cookie.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return
+
+    response.set_signed_cookie(
+        PIN_COOKIE, str(user_id), salt=PIN_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS, httponly=True,
+        samesite='Lax'
+    )
+    if is_shared_cache():
+        cache.set(pin_key(user_id), True,
+                  timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(request, user_id):
+    pinned = request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS
+    )
+    if pinned == str(user_id):
+        return True
+    return is_shared_cache() and bool(cache.get(pin_key(user_id)))
@@ -0,0 +1,164 @@
+import re
+import threading
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, FloatField, Value, When
+
+from recipe.models import Ingredient, IngredientRecipe, Recipe
+from recipe.replicas import primary
+from recipe.versions import get_version
+
+SEARCH_CONFIG = 'russian'
+WORD_RE = re.compile(r'\w+')
+SUFFIXES = sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ая', 'яя',
+    'ое', 'ее', 'ые', 'ие', 'ой', 'ей', 'ий', 'ый', 'ом', 'ем', 'ам', 'ям',
+    'ах', 'ях', 'ов', 'ев', 'ью', 'ия', 'ы', 'и', 'а', 'я', 'о', 'е', 'у',
+    'ю', 'ь', 'й',
+), key=len, reverse=True)
+FIELD_WEIGHTS = {
+    'name': 1.0,
+    'ingredients': 0.4,
+    'text': 0.2,
+}
+
+UPDATE_SEARCH_VECTOR_SQL = (
+    "UPDATE {recipe} SET search_vector = "
+    "setweight(to_tsvector(%(config)s, coalesce({recipe}.name, '')), 'A') "
+    "|| setweight(to_tsvector(%(config)s, coalesce(("
+    "SELECT string_agg(ingredient.name, ' ') "
+    "FROM {ingredient_recipe} AS ingredient_recipe "
+    "JOIN {ingredient} AS ingredient "
+    "ON ingredient.id = ingredient_recipe.ingredient_id "
+    "WHERE ingredient_recipe.recipe_id = {recipe}.id), '')), 'B') "
+    "|| setweight(to_tsvector(%(config)s, coalesce({recipe}.text, '')), 'C')"
+)
+
+
+def uses_postgres_search():
+    return connection.vendor == 'postgresql'
+
+
+def update_search_vectors(recipe_ids=None):
+    """Пересчитывает tsvector для рецептов (для всех, если None)."""
+    if not uses_postgres_search():
+        return
+
+    sql = UPDATE_SEARCH_VECTOR_SQL.format(
+        recipe=Recipe._meta.db_table,
+        ingredient_recipe=IngredientRecipe._meta.db_table,
+        ingredient=Ingredient._meta.db_table,
+    )
+    params = {'config': SEARCH_CONFIG}
+    if recipe_ids is not None:
+        sql += ' WHERE id = ANY(%(ids)s)'
+        params['ids'] = list(recipe_ids)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def stem(word):
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_RE.findall(text.casefold())]
+
+
+class RecipeSearchIndex:
+    """
+    Инвертированный индекс рецептов в памяти процесса.
+
+    Используется вместо полнотекстового поиска PostgreSQL на других СУБД
+    (например, SQLite в тестовом окружении).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+
+    def search(self, query):
+        terms = set(tokenize(query))
+        if not terms:
+            return {}
+
+        postings = self._load()
+        scores = None
+        for term in terms:
+            matches = postings.get(term, {})
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {recipe: score + matches[recipe]
+                          for recipe, score in scores.items()
+                          if recipe in matches}
+            if not scores:
+                return {}
+
+        return scores
+
+    def _load(self):
+        version = (get_version('recipes'), get_version('ingredients'))
+
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    with primary():
+                        self._build(version)
+
+        return self._postings
+
+    def _build(self, version):
+        postings = defaultdict(lambda: defaultdict(float))
+
+        def add(recipe_id, text, weight):
+            for term in tokenize(text):
+                postings[term][recipe_id] += weight
+
+        for recipe_id, name, text in Recipe.objects.values_list(
+                'id', 'name', 'text').iterator():
+            add(recipe_id, name, FIELD_WEIGHTS['name'])
+            add(recipe_id, text, FIELD_WEIGHTS['text'])
+
+        for recipe_id, name in IngredientRecipe.objects.values_list(
+                'recipe_id', 'ingredient__name').iterator():
+            add(recipe_id, name, FIELD_WEIGHTS['ingredients'])
+
+        self._postings = {term: dict(recipes)
+                          for term, recipes in postings.items()}
+        self._version = version
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+def search_recipes(queryset, query):
+    if uses_postgres_search():
+        search_query = SearchQuery(query, config=SEARCH_CONFIG,
+                                   search_type='websearch')
+        return (
+            queryset
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', '-id')
+        )
+
+    scores = recipe_search_index.search(query)
+    return (
+        queryset
+        .filter(id__in=scores)
+        .annotate(rank=Case(
+            *[When(id=recipe, then=Value(score))
+              for recipe, score in scores.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+        .order_by('-rank', '-id')
+    )
@@ -0,0 +1,113 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from recipe.models import IngredientRecipe, ShoppingCart, ShoppingListItem
+
+
+def recipe_amounts(recipe_id):
+    return recipes_amounts([recipe_id])
+
+
+def recipes_amounts(recipe_ids):
+    return Counter(dict(
+        IngredientRecipe.objects
+        .filter(recipe_id__in=recipe_ids)
+        .values('ingredient')
+        .annotate(total=Sum('amount'))
+        .order_by()
+        .values_list('ingredient', 'total')
+    ))
+
+
+def cart_users(recipe_id):
+    return list(ShoppingCart.objects.filter(recipe_id=recipe_id)
+                .values_list('user_id', flat=True))
+
+
+def aggregated_amounts(user_ids, ingredient_ids=None):
+    amounts = IngredientRecipe.objects.filter(
+        recipe__shoppingcart__user__in=user_ids
+    )
+    if ingredient_ids is not None:
+        amounts = amounts.filter(ingredient__in=ingredient_ids)
+
+    return (
+        amounts
+        .values('recipe__shoppingcart__user', 'ingredient')
+        .annotate(total=Sum('amount'))
+        .order_by()
+        .values_list('recipe__shoppingcart__user', 'ingredient', 'total')
+    )
+
+
+@transaction.atomic
+def rebuild_shopping_list(user_ids, ingredient_ids=None):
+    items = ShoppingListItem.objects.filter(user__in=user_ids)
+    if ingredient_ids is not None:
+        items = items.filter(ingredient__in=ingredient_ids)
+
+    items.delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=user, ingredient_id=ingredient,
+                         total_amount=total)
+        for user, ingredient, total in aggregated_amounts(user_ids,
+                                                          ingredient_ids)
+    )
+
+
+@transaction.atomic
+def apply_shopping_list_delta(user_ids, delta):
+    """
+    Прибавляет к агрегатам пользователей изменения количеств
+    {ingredient_id: amount}. Отрицательные значения уменьшают итог,
+    позиции с нулевым итогом удаляются.
+    """
+    delta = {ingredient: amount
+             for ingredient, amount in delta.items() if amount}
+    if not user_ids or not delta:
+        return
+
+    items = ShoppingListItem.objects.filter(user__in=user_ids,
+                                            ingredient__in=delta)
+    existing = {
+        (item.user_id, item.ingredient_id): item
+        for item in items.select_for_update()
+    }
+    for item in existing.values():
+        item.total_amount = F('total_amount') + delta[item.ingredient_id]
+    ShoppingListItem.objects.bulk_update(existing.values(), ['total_amount'])
+
+    missing = [
+        ShoppingListItem(user_id=user, ingredient_id=ingredient,
+                         total_amount=amount)
+        for user in user_ids
+        for ingredient, amount in delta.items()
+        if amount > 0 and (user, ingredient) not in existing
+    ]
+    try:
+        with transaction.atomic():
+            ShoppingListItem.objects.bulk_create(missing)
+    except IntegrityError:
+        rebuild_shopping_list(user_ids, list(delta))
+        return
+
+    items.filter(total_amount__lte=0).delete()
+
+
+def add_to_shopping_list(user_id, recipe_ids):
+    apply_shopping_list_delta([user_id], recipes_amounts(recipe_ids))
+
+
+def remove_from_shopping_list(user_id, recipe_ids):
+    apply_shopping_list_delta([user_id], {
+        ingredient: -amount
+        for ingredient, amount in recipes_amounts(recipe_ids).items()
+    })
+
+
+def update_recipe_in_shopping_lists(recipe_id, old_amounts, new_amounts):
+    delta = Counter(new_amounts)
+    delta.subtract(old_amounts)
+    apply_shopping_list_delta(cart_users(recipe_id), delta)
@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipe.models import Ingredient, Recipe, Tag
+from recipe.pantry import record_changes
+from recipe.search import update_search_vectors
+from recipe.versions import bump_version
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    bump_version('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(sender, **kwargs):
+    bump_version('tags')
+
+
+# Составы рецептов (IngredientRecipe) меняют сериализатор, админка и
+# load_csv, они же пересчитывают производные данные один раз на рецепт.
+# Приёмники сигналов IngredientRecipe сделали бы удаление по queryset
+# построчным.
+@receiver((post_save, post_delete), sender=Recipe)
+def recipes_changed(sender, **kwargs):
+    bump_version('recipes')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    update_search_vectors([instance.id])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    record_changes([instance.id])
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, **kwargs):
+    update_search_vectors(
+        instance.ingredient_recipe.values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    record_changes(
+        instance.ingredient_recipe.values_list('recipe_id', flat=True)
+    )
@@ -0,0 +1,188 @@
+import heapq
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from recipe.models import IngredientRecipe, Recipe, SimilarRecipe
+
+BATCH_SIZE = 1000
+
+
+def load_sets(recipe_ids=None):
+    """Составы и теги рецептов: {recipe_id: set(id)}."""
+    ingredients, tags = defaultdict(set), defaultdict(set)
+    ingredient_rows = IngredientRecipe.objects.order_by()
+    tag_rows = Recipe.tags.through.objects.order_by()
+    if recipe_ids is not None:
+        ingredient_rows = ingredient_rows.filter(recipe__in=recipe_ids)
+        tag_rows = tag_rows.filter(recipe__in=recipe_ids)
+
+    for recipe, ingredient in ingredient_rows.values_list(
+            'recipe', 'ingredient').iterator():
+        ingredients[recipe].add(ingredient)
+    for recipe, tag in tag_rows.values_list('recipe', 'tag').iterator():
+        tags[recipe].add(tag)
+    return ingredients, tags
+
+
+def score(ingredients, other_ingredients, tags, other_tags):
+    """
+    Коэффициент Жаккара по ингредиентам, смешанный с коэффициентом по
+    тегам с весом SIMILAR_RECIPES_TAG_WEIGHT. Без общих ингредиентов
+    рецепты не похожи.
+    """
+    shared = len(ingredients & other_ingredients)
+    if not shared:
+        return 0.0
+
+    ingredient_score = shared / len(ingredients | other_ingredients)
+    tag_union = len(tags | other_tags)
+    tag_score = len(tags & other_tags) / tag_union if tag_union else 0
+    weight = settings.SIMILAR_RECIPES_TAG_WEIGHT
+    return round((1 - weight) * ingredient_score + weight * tag_score, 6)
+
+
+def rare_ingredients(ingredients, sizes):
+    """
+    Ингредиенты, по которым ищутся кандидаты: встречаются не больше чем
+    в SIMILAR_RECIPES_MAX_POSTING рецептах. Соль и сахар есть почти
+    везде: их списки рецептов сделали бы поиск квадратичным, а в оценке
+    они всё равно учитываются.
+    """
+    limit = settings.SIMILAR_RECIPES_MAX_POSTING
+    rare = [ingredient for ingredient in ingredients
+            if sizes.get(ingredient, 0) <= limit]
+    if not rare and ingredients:
+        rare = [min(ingredients, key=lambda ingredient: sizes[ingredient])]
+    return rare
+
+
+def top_candidates(shared):
+    """Кандидаты с наибольшим числом общих редких ингредиентов."""
+    return heapq.nsmallest(settings.SIMILAR_RECIPES_CANDIDATES, shared,
+                           key=lambda recipe: (-shared[recipe], recipe))
+
+
+def top_similar(recipe, candidates, ingredients, tags):
+    """SIMILAR_RECIPES_COUNT лучших пар (id, score), при равенстве — новее."""
+    scored = []
+    for other in candidates:
+        value = score(ingredients[recipe], ingredients[other],
+                      tags[recipe], tags[other])
+        if other != recipe and value > 0:
+            scored.append((value, other))
+    return [(other, value) for value, other in heapq.nlargest(
+        settings.SIMILAR_RECIPES_COUNT, scored)]
+
+
+def entries(recipe, neighbours):
+    return [SimilarRecipe(recipe_id=recipe, similar_id=other, score=value)
+            for other, value in neighbours]
+
+
+@transaction.atomic
+def replace_similar(neighbours, recipe_ids=None):
+    rows = SimilarRecipe.objects.all()
+    if recipe_ids is not None:
+        rows = rows.filter(recipe__in=recipe_ids)
+    rows.delete()
+    SimilarRecipe.objects.bulk_create(
+        [entry for recipe, items in neighbours.items()
+         for entry in entries(recipe, items)],
+        batch_size=BATCH_SIZE
+    )
+
+
+def build_similar(recipe_ids=None):
+    """
+    Полный пересчёт по инвертированному индексу ингредиент → рецепты в
+    памяти: кандидаты — рецепты с общими редкими ингредиентами, из них
+    остаются лучшие по score. Без recipe_ids таблица пересобирается
+    целиком.
+    """
+    ingredients, tags = load_sets()
+    postings = defaultdict(list)
+    for recipe, items in ingredients.items():
+        for ingredient in items:
+            postings[ingredient].append(recipe)
+    sizes = {ingredient: len(items) for ingredient, items in postings.items()}
+
+    targets = ingredients.keys()
+    if recipe_ids is not None:
+        targets = set(recipe_ids) & targets
+
+    neighbours = {}
+    for recipe in targets:
+        shared = Counter()
+        for ingredient in rare_ingredients(ingredients[recipe], sizes):
+            shared.update(postings[ingredient])
+        del shared[recipe]
+        neighbours[recipe] = top_similar(recipe, top_candidates(shared),
+                                         ingredients, tags)
+
+    replace_similar(neighbours, recipe_ids)
+    return len(neighbours)
+
+
+def update_similar(recipe_id):
+    """
+    Пересчёт после изменения состава или тегов рецепта: его соседи и
+    место рецепта в списках кандидатов и рецептов, где он уже был.
+    Если рецепт выпал из чужого списка или опустился в нём, следующий
+    кандидат займёт его место только при полном пересчёте
+    (build_similar_recipes).
+    """
+    own_ingredients, own_tags = load_sets([recipe_id])
+    items = own_ingredients[recipe_id]
+
+    candidates = []
+    if items:
+        sizes = dict(
+            IngredientRecipe.objects
+            .filter(ingredient__in=items)
+            .values('ingredient')
+            .annotate(size=Count('recipe', distinct=True))
+            .order_by()
+            .values_list('ingredient', 'size')
+        )
+        shared = dict(
+            IngredientRecipe.objects
+            .filter(ingredient__in=rare_ingredients(items, sizes))
+            .exclude(recipe=recipe_id)
+            .values('recipe')
+            .annotate(shared=Count('ingredient', distinct=True))
+            .order_by()
+            .values_list('recipe', 'shared')
+        )
+        candidates = top_candidates(shared)
+
+    listed_in = set(SimilarRecipe.objects.filter(
+        similar=recipe_id).values_list('recipe', flat=True))
+    others = set(candidates) | listed_in
+    ingredients, tags = load_sets(others)
+    ingredients[recipe_id], tags[recipe_id] = items, own_tags[recipe_id]
+
+    current = defaultdict(dict)
+    for recipe, other, value in SimilarRecipe.objects.filter(
+            recipe__in=others).values_list('recipe', 'similar', 'score'):
+        current[recipe][other] = value
+
+    neighbours = {recipe_id: top_similar(recipe_id, candidates,
+                                         ingredients, tags)}
+    for recipe in others:
+        listed = dict(current[recipe])
+        listed.pop(recipe_id, None)
+        value = score(ingredients[recipe], items, tags[recipe],
+                      own_tags[recipe_id])
+        if value > 0:
+            listed[recipe_id] = value
+        updated = [(other, value) for value, other in heapq.nlargest(
+            settings.SIMILAR_RECIPES_COUNT,
+            ((value, other) for other, value in listed.items())
+        )]
+        if dict(updated) != current[recipe]:
+            neighbours[recipe] = updated
+
+    replace_similar(neighbours, list(neighbours))
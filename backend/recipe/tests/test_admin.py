@@ -0,0 +1,59 @@
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from recipe.lifecycle import recipe_created
+from recipe.models import (Ingredient, IngredientRecipe, Recipe,
+                           ShoppingCart, ShoppingListItem, Subscribe,
+                           TimelineEntry)
+from recipe.shopping_list import add_to_shopping_list
+from recipe.timeline import expected_entries
+
+User = get_user_model()
+
+
+class AdminDerivedDataTest(TestCase):
+    """Удаления из админки пересчитывают то же, что и удаления через API."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        Subscribe.objects.create(user=self.reader, author=self.author)
+        User.objects.filter(pk=self.author.pk).update(followers_count=1)
+
+        self.recipe = Recipe.objects.create(
+            name='Рецепт', author=self.author, text='Текст',
+            image='recipe_images/recipe.png', cooking_time=10
+        )
+        IngredientRecipe.objects.create(
+            recipe=self.recipe, amount=5,
+            ingredient=Ingredient.objects.create(name='Соль',
+                                                 measurement_unit='г')
+        )
+        recipe_created(self.recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        add_to_shopping_list(self.reader.id, [self.recipe.id])
+
+    def admin(self, model):
+        return site._registry[model]
+
+    def test_recipe_delete(self):
+        self.admin(Recipe).delete_queryset(None, Recipe.objects.all())
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_subscription_delete(self):
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.admin(Subscribe).delete_queryset(None, Subscribe.objects.all())
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+        self.assertEqual(expected_entries(), set())
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_cart_delete(self):
+        cart = ShoppingCart.objects.get()
+        self.admin(ShoppingCart).delete_model(None, cart)
+        self.assertFalse(ShoppingListItem.objects.exists())
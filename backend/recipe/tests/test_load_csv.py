@@ -0,0 +1,54 @@
+import io
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from recipe.models import Ingredient
+
+VALID = ('[{"name": "Соль", "measurement_unit": "г"}, '
+         '{"name": "Сахар", "measurement_unit": "г"}]')
+
+
+class LoadJsonTest(TestCase):
+    """Загрузка ингредиентов из JSON: битый файл — ошибка, а не обрезка."""
+
+    def load(self, content):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'ingredients.json'
+        path.write_text(content, encoding='utf8')
+        call_command('load_csv', str(path), stdout=io.StringIO())
+
+    def test_valid_array(self):
+        self.load(VALID)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_objects_split_between_chunks(self):
+        with mock.patch(
+                'recipe.management.commands.load_csv.JSON_CHUNK_SIZE', 7):
+            self.load(VALID)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_truncated_input(self):
+        for content in (VALID[:-1], VALID[:-20], '[', ''):
+            with self.subTest(content=content):
+                with self.assertRaises(CommandError):
+                    self.load(content)
+        self.assertFalse(Ingredient.objects.exists())
+
+    def test_malformed_input(self):
+        for content in (
+            '[{"name": "a", "measurement_unit": "г"}, '
+            '{"name": "b", broken}, '
+            '{"name": "c", "measurement_unit": "г"}]',
+            '{"name": "a", "measurement_unit": "г"}',
+            '[{"name": "a"}]',
+            '[["a", "г"]]',
+        ):
+            with self.subTest(content=content):
+                with self.assertRaises(CommandError):
+                    self.load(content)
+        self.assertFalse(Ingredient.objects.exists())
@@ -0,0 +1,150 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipe.models import Favorite, Recipe
+from recipe.replicas import PIN_COOKIE, ReplicaRouter, primary, reading_from
+
+User = get_user_model()
+
+REPLICA = 'replica_1'
+
+# Отдельная тестовая база вместо реплик из DB_REPLICA_HOSTS: те в тестах
+# зеркалят основную, и по ответу не понять, откуда он прочитан.
+TEST_REPLICA = 'test_replica'
+
+if TEST_REPLICA not in connections.databases:
+    primary_settings = connections.databases[DEFAULT_DB_ALIAS]
+    connections.databases[TEST_REPLICA] = {
+        **primary_settings,
+        'TEST': ({} if 'sqlite' in primary_settings['ENGINE'] else
+                 {'NAME': f"test_{primary_settings['NAME']}_replica"}),
+    }
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRouterTest(SimpleTestCase):
+    """Маршрутизация без запросов к базе: QuerySet.db спрашивает роутер."""
+
+    def test_reads_go_to_selected_replica(self):
+        with reading_from(REPLICA):
+            self.assertEqual(Recipe.objects.all().db, REPLICA)
+
+    def test_reads_without_replica_go_to_primary(self):
+        self.assertEqual(Recipe.objects.all().db, DEFAULT_DB_ALIAS)
+        with reading_from(REPLICA), primary():
+            self.assertEqual(Recipe.objects.all().db, DEFAULT_DB_ALIAS)
+
+    def test_writes_go_to_primary(self):
+        router = ReplicaRouter()
+        with reading_from(REPLICA):
+            self.assertEqual(router.db_for_write(Recipe), DEFAULT_DB_ALIAS)
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'recipe'))
+        self.assertFalse(router.allow_migrate(REPLICA, 'recipe'))
+
+
+@override_settings(DATABASE_REPLICAS=[TEST_REPLICA],
+                   REPLICA_STICKY_SECONDS=10)
+class ReplicaReadTest(TransactionTestCase):
+    """
+    Запросы API к настоящей второй базе. Реплика в тестах не зеркало
+    основной: в ней тот же рецепт под другим названием, и по названию
+    в ответе видно, из какой базы он прочитан.
+    """
+
+    databases = {DEFAULT_DB_ALIAS, TEST_REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Роутер не пускает миграции на реплики: схему в тестовой
+        # реплике создаём напрямую.
+        connection = connections[TEST_REPLICA]
+        existing = set(connection.introspection.table_names())
+        with connection.schema_editor() as editor:
+            for model in apps.get_models():
+                if (model._meta.managed and not model._meta.proxy
+                        and model._meta.db_table not in existing):
+                    editor.create_model(model)
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        self.recipe = Recipe.objects.create(
+            name='Основная', author=self.user, text='Текст',
+            image='recipe_images/recipe.png', cooking_time=10
+        )
+        # bulk_create не вызывает сигналы, которые писали бы в основную.
+        User.objects.using(TEST_REPLICA).bulk_create([
+            User(id=self.user.id, username=self.user.username,
+                 email=self.user.email, password=self.user.password)
+        ])
+        Recipe.objects.using(TEST_REPLICA).bulk_create([
+            Recipe(id=self.recipe.id, name='Реплика', author_id=self.user.id,
+                   text='Текст', image='recipe_images/recipe.png',
+                   cooking_time=10)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.addCleanup(cache.clear)
+        self.addCleanup(self.flush_replica)
+
+    @staticmethod
+    def flush_replica():
+        # flush после теста спрашивает роутер и реплику пропускает.
+        connection = connections[TEST_REPLICA]
+        connection.ops.execute_sql_flush(connection.ops.sql_flush(
+            no_style(), connection.introspection.table_names()))
+
+    def recipe_names(self, client):
+        response = client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def favorite(self, client=None):
+        return (client or self.client).post(
+            f'/api/recipes/{self.recipe.id}/favorite/')
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.recipe_names(self.client), ['Реплика'])
+        self.assertEqual(self.recipe_names(APIClient()), ['Реплика'])
+
+    def test_writes_go_to_primary(self):
+        response = self.favorite()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['name'], 'Основная')
+        self.assertTrue(Favorite.objects.using(DEFAULT_DB_ALIAS).filter(
+            user=self.user, recipe=self.recipe).exists())
+        self.assertFalse(Favorite.objects.using(TEST_REPLICA).exists())
+
+    def test_reads_after_write_are_pinned_to_primary(self):
+        response = self.favorite()
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        # Закрепление в cookie не зависит от кеша воркера.
+        cache.clear()
+        self.assertEqual(self.recipe_names(self.client), ['Основная'])
+
+    def test_pin_belongs_to_user(self):
+        response = self.favorite()
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='pass')
+        client = APIClient()
+        client.force_authenticate(other)
+        client.cookies[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertEqual(self.recipe_names(client), ['Реплика'])
+
+    def test_failed_write_does_not_pin(self):
+        response = self.client.post('/api/recipes/0/favorite/')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_atomic_block_reads_from_primary(self):
+        with reading_from(TEST_REPLICA):
+            self.assertEqual(Recipe.objects.get().name, 'Реплика')
+            with transaction.atomic():
+                self.assertEqual(Recipe.objects.get().name, 'Основная')
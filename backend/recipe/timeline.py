@@ -0,0 +1,128 @@
+import heapq
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from recipe.models import Recipe, Subscribe, TimelineEntry
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+
+def is_fan_in(followers_count):
+    return followers_count >= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def followers_count(author_id):
+    return User.objects.filter(pk=author_id).values_list(
+        'followers_count', flat=True).first() or 0
+
+
+def write_entries(pairs):
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user, recipe_id=recipe, author_id=author)
+         for user, recipe, author in pairs],
+        batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def expected_entries(user_ids=None):
+    """
+    Записи лент по подпискам: все рецепты авторов, у которых меньше
+    FEED_FANOUT_MAX_FOLLOWERS подписчиков.
+    """
+    subscriptions = Subscribe.objects.exclude(
+        author__followers_count__gte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    )
+    if user_ids is not None:
+        subscriptions = subscriptions.filter(user__in=user_ids)
+
+    authors = {}
+    for user, author in subscriptions.values_list('user', 'author'):
+        authors.setdefault(author, []).append(user)
+
+    recipes = Recipe.objects.filter(author__in=authors).order_by().values_list(
+        'id', 'author')
+    return {
+        (user, recipe, author)
+        for recipe, author in recipes.iterator()
+        for user in authors[author]
+    }
+
+
+def fan_out(recipe):
+    """
+    Новый рецепт в ленты подписчиков автора. Рецепты авторов с
+    FEED_FANOUT_MAX_FOLLOWERS подписчиков и больше не копируются:
+    лента дочитывает их при чтении.
+    """
+    if is_fan_in(followers_count(recipe.author_id)):
+        return
+
+    followers = Subscribe.objects.filter(
+        author=recipe.author_id).values_list('user', flat=True)
+    write_entries((user, recipe.id, recipe.author_id)
+                  for user in followers.iterator())
+
+
+def follow(user_id, author_id):
+    """Вызывается после сохранения подписки и счётчика подписчиков."""
+    count = followers_count(author_id)
+
+    if count == settings.FEED_FANOUT_MAX_FOLLOWERS:
+        # Автор перешёл на чтение при запросе ленты.
+        TimelineEntry.objects.filter(author=author_id).delete()
+    elif not is_fan_in(count):
+        recipes = Recipe.objects.filter(author=author_id).values_list(
+            'id', flat=True)
+        write_entries((user_id, recipe, author_id)
+                      for recipe in recipes.iterator())
+
+
+def unfollow(user_id, author_id):
+    """Вызывается после удаления подписки и счётчика подписчиков."""
+    TimelineEntry.objects.filter(user=user_id, author=author_id).delete()
+
+    if followers_count(author_id) == settings.FEED_FANOUT_MAX_FOLLOWERS - 1:
+        # Автор вернулся к рассылке: его рецепты копируются в ленты.
+        followers = list(Subscribe.objects.filter(
+            author=author_id).values_list('user', flat=True))
+        recipes = Recipe.objects.filter(author=author_id).values_list(
+            'id', flat=True)
+        write_entries((user, recipe, author_id)
+                      for recipe in recipes.iterator()
+                      for user in followers)
+
+
+def rebuild_timeline(user_ids):
+    user_ids = list(user_ids)
+    TimelineEntry.objects.filter(user__in=user_ids).delete()
+    write_entries(expected_entries(user_ids))
+
+
+def feed_ids(user_id, before=None, limit=None):
+    """
+    id рецептов ленты по убыванию, меньше before: записи ленты
+    пользователя и рецепты авторов, которые в ленты не копируются.
+    """
+    timeline = TimelineEntry.objects.filter(user=user_id)
+    fan_in_authors = list(Subscribe.objects.filter(
+        user=user_id,
+        author__followers_count__gte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('author', flat=True))
+    fan_in = Recipe.objects.filter(author__in=fan_in_authors)
+    if before is not None:
+        timeline = timeline.filter(recipe_id__lt=before)
+        fan_in = fan_in.filter(id__lt=before)
+
+    sources = [timeline.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True)]
+    if fan_in_authors:
+        sources.append(fan_in.order_by('-id').values_list('id', flat=True))
+    if limit is not None:
+        sources = [source[:limit] for source in sources]
+
+    merged = heapq.merge(*map(list, sources), reverse=True)
+    result = list(dict.fromkeys(merged))
+    return result if limit is None else result[:limit]
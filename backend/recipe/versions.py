@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def is_shared_cache(alias=DEFAULT_CACHE_ALIAS):
+    """Кеш общий для всех процессов (memcached), а не память воркера."""
+    return not isinstance(caches[alias], LOCAL_CACHES)
+
+
+def version_timeout():
+    """
+    В общем кеше версии живут бессрочно. В памяти процесса изменение из
+    другого воркера или команды не видно, поэтому версия истекает через
+    VERSION_LOCAL_TIMEOUT секунд и всё, что к ней привязано, перечитывается.
+    """
+    return None if is_shared_cache() else settings.VERSION_LOCAL_TIMEOUT
+
+
+def version_key(*parts):
+    return 'version:' + ':'.join(str(part) for part in parts)
+
+
+def get_version(*parts):
+    key = version_key(*parts)
+    version = cache.get(key)
+
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=version_timeout())
+        version = cache.get(key)
+
+    return version
+
+
+def bump_version(*parts):
+    cache.set(version_key(*parts), time.time_ns(), timeout=version_timeout())
@@ -9,5 +9,6 @@ class UserAdmin(admin.ModelAdmin):
     list_display = ('id', 'email', 'username', 'first_name', 'last_name', )
     list_filter = ('id', 'email', 'username',)
     list_editable = ('email', 'username', 'first_name', 'last_name', )
+    readonly_fields = ('recipes_count', 'followers_count', )
     list_max_show_all = 15
     empty_value_display = '-пусто-'
@@ -12,6 +12,12 @@ class User(AbstractUser):
     email = models.EmailField(verbose_name='Почта', max_length=254,
                               unique=True)
     password = models.CharField(verbose_name='Пароль', max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов', default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков', default=0
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
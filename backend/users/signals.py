@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipe.versions import bump_version
+
+User = get_user_model()
+
+
+def revoke(user_id):
+    """
+    Сбрасывает снимки пользователя в кеше токенов. После коммита: иначе
+    другой воркер мог бы прочитать незакоммиченные данные под новой
+    версией.
+    """
+    transaction.on_commit(lambda: bump_version('auth', user_id))
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(sender, instance, **kwargs):
+    revoke(instance.id)
+
+
+@receiver((post_save, post_delete), sender=Token)
+def token_changed(sender, instance, **kwargs):
+    revoke(instance.user_id)
+
+
+@receiver(user_logged_out)
+def logged_out(sender, user, **kwargs):
+    if user is not None:
+        revoke(user.id)